@@ -8,7 +8,7 @@ import dotenv
 from haystack.components.generators.chat import OpenAIChatGenerator
 from haystack.dataclasses import ChatMessage
 from haystack.tools import Tool
-from mcp import ClientSession, StdioServerParameters
+from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
 
 LOGGER = logging.getLogger(__name__)
@@ -27,19 +27,34 @@ llm = OpenAIChatGenerator(
 messages = [ChatMessage.from_system("Be a simple chat bot.")]
 
 
-def convert_mcp_tool_to_haystack_tool(mcp_tool, f):
-    """Convert MCP tool to Haystack tool."""
+def convert_mcp_tool_to_haystack_tool(mcp_tool, session, loop):
+    """Convert MCP tool to Haystack tool.
 
-    async def _f(x):
+    The tool function runs the call on the loop owning the session instead of
+    starting a new event loop per call, so it must be invoked from another thread.
+    """
+
+    def _f(**kwargs):
         """Call the tool function."""
-        logging.info("Calling tool: %s with args: %s", mcp_tool.name, x)
-        return f((mcp_tool.name, x))
+        logging.info("Calling tool: %s with args: %s", mcp_tool.name, kwargs)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            # Blocking on the result here would wait for this very loop forever
+            raise RuntimeError(
+                f"Tool {mcp_tool.name} must be called from another thread than its loop"
+            )
+        return asyncio.run_coroutine_threadsafe(
+            session.call_tool(mcp_tool.name, kwargs), loop
+        ).result()
 
     return Tool(
         name=mcp_tool.name,
         description=mcp_tool.description,
         parameters=mcp_tool.inputSchema,
-        function=lambda x: asyncio.run(_f(x)),
+        function=_f,
     )
 
 
@@ -49,6 +64,7 @@ class MCPClient:
     def __init__(self):
         """Initialize session and client objects."""
         self.session: ClientSession | None
+        self.tools: list[Tool] | None = None
         self.exit_stack = AsyncExitStack()
 
     async def connect_to_server(self, server_script_path: str):
@@ -73,14 +89,13 @@ class MCPClient:
         )
         self.stdio, self.write = stdio_transport
         self.session = await self.exit_stack.enter_async_context(
-            ClientSession(self.stdio, self.write)
+            ClientSession(self.stdio, self.write, message_handler=self.on_message)
         )
 
         await self.session.initialize()
 
         # List available tools
-        response = await self.session.list_tools()
-        tools = response.tools
+        tools = await self.list_tools()
         logging.info(
             "\nConnected to server with tools: %s", [tool.name for tool in tools]
         )
@@ -101,15 +116,28 @@ class MCPClient:
             [prompt.name for prompt in prompts],
         )
 
+    async def on_message(self, message):
+        """Drop the cached tools when the server notifies that they changed."""
+        if isinstance(message, types.ServerNotification) and isinstance(
+            message.root, types.ToolListChangedNotification
+        ):
+            logging.info("Tool list changed, refreshing on next use")
+            self.tools = None
+
+    async def list_tools(self) -> list[Tool]:
+        """Return the tools of the server, fetched only once until they change."""
+        if self.tools is None:
+            loop = asyncio.get_running_loop()
+            self.tools = [
+                convert_mcp_tool_to_haystack_tool(tool, self.session, loop)
+                for tool in (await self.session.list_tools()).tools
+            ]
+        return self.tools
+
     async def generate(self) -> str:
         """Generate response using available tools."""
 
-        tools = [
-            convert_mcp_tool_to_haystack_tool(
-                tool, lambda args: self.session.call_tool(args.tool, args.x)
-            )
-            for tool in (await self.session.list_tools()).tools
-        ]
+        tools = await self.list_tools()
         logging.info("Available tools: %s", [tool.name for tool in tools])
 
         response = llm.run(messages=messages, tools=tools)
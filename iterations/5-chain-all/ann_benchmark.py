@@ -0,0 +1,250 @@
+"""Measure the recall@10 and latency of approximate search against exact search.
+
+Writes synthetic clustered unit vectors to an embedded store with IVF lists
+and/or quantized codes, in batches as `indexing.py` does, or opens an existing
+store. Queries are perturbed stored vectors; for each `nprobe`, the top 10 of
+the approximate search is compared with the top 10 of an exact scan.
+"""
+
+import argparse
+import json
+import logging
+from pathlib import Path
+import shutil
+import time
+
+from benchmark_stats import memory_peak_mb, percentiles
+from embedded_store import EmbeddedDocumentStore
+from haystack import Document
+import numpy as np
+import quantization
+
+LOGGER = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+
+DIR = Path(__file__).resolve().parent
+ANN_BENCHMARK = DIR / ".cache" / "benchmark" / "ann"
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    """Return the vectors scaled to unit length."""
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def noise(shape: tuple[int, int], scale: float, rng: np.random.Generator):
+    """Return random vectors of length about `scale`."""
+    return rng.normal(scale=scale / np.sqrt(shape[1]), size=shape).astype(np.float32)
+
+
+def clustered_vectors(
+    topics: np.ndarray, rows: int, spread: float, rng: np.random.Generator
+) -> np.ndarray:
+    """Return `rows` unit vectors around random `topics`, `spread` away from them."""
+    vectors = topics[rng.integers(len(topics), size=rows)]
+    return unit(vectors + noise(vectors.shape, spread, rng))
+
+
+def build(path: Path, args: argparse.Namespace) -> dict:
+    """Write the synthetic vectors to a new store, return the build stats."""
+    shutil.rmtree(path, ignore_errors=True)
+    store = EmbeddedDocumentStore(
+        path,
+        embedding_dim=args.dim,
+        dtype=args.dtype,
+        ivf=args.ivf,
+        nlist=args.nlist,
+        ivf_min_rows=args.ivf_min_rows,
+        quantization=args.quantization,
+    )
+    rng = np.random.default_rng(args.seed)
+    topics = unit(rng.normal(size=(args.clusters, args.dim)).astype(np.float32))
+    started = time.perf_counter()
+    for start in range(0, args.rows, args.batch_size):
+        vectors = clustered_vectors(
+            topics, min(args.batch_size, args.rows - start), args.spread, rng
+        )
+        store.write_documents(
+            [
+                Document(
+                    id=str(start + i),
+                    content=f"chunk {start + i}",
+                    meta={"source_path": f"{(start + i) // 10}.txt"},
+                    embedding=vector,
+                )
+                for i, vector in enumerate(vectors)
+            ]
+        )
+    return {
+        "rows": args.rows,
+        "seconds": time.perf_counter() - started,
+        "size_mb": sum(f.stat().st_size for f in path.iterdir()) / 2**20,
+    }
+
+
+def footprint_mb(store: EmbeddedDocumentStore) -> dict:
+    """Return the size of the vectors and of their codes, scanned by searches."""
+    itemsize = np.dtype(store.dtype).itemsize
+    codes = (
+        store.rows * quantization.code_size(store._quantized, store.embedding_dim)
+        if store._quantized is not None
+        else None
+    )
+    return {
+        "vectors_mb": store.rows * store.embedding_dim * itemsize / 2**20,
+        "codes_mb": codes / 2**20 if codes is not None else None,
+    }
+
+
+def measure(
+    store: EmbeddedDocumentStore, queries: np.ndarray, nprobes: list[int], k: int = 10
+) -> dict:
+    """Return the latency of exact search and, per `nprobe`, of approximate search.
+
+    `nprobe` only matters with IVF lists.
+    """
+    exact, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        exact.append({d.id for d in store.embedding_retrieval(query, k, exact=True)})
+        latencies.append(time.perf_counter() - started)
+    result = {"exact": {"latency": percentiles(latencies)}, "approximate": {}}
+    for nprobe in nprobes:
+        found, latencies = 0, []
+        for query, expected in zip(queries, exact, strict=True):
+            started = time.perf_counter()
+            documents = store.embedding_retrieval(query, k, nprobe=nprobe)
+            latencies.append(time.perf_counter() - started)
+            found += len(expected & {d.id for d in documents})
+        result["approximate"][str(nprobe)] = {
+            f"recall_at_{k}": found / max(sum(map(len, exact)), 1),
+            "latency": percentiles(latencies),
+        }
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--store",
+        type=Path,
+        default=None,
+        help="Existing embedded store to measure instead of synthetic vectors",
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=200_000,
+        help="Synthetic vectors written (default: 200000)",
+    )
+    parser.add_argument(
+        "--dim", type=int, default=384, help="Vector dimension (default: 384)"
+    )
+    parser.add_argument(
+        "--clusters",
+        type=int,
+        default=1000,
+        help="Topics the synthetic vectors gather around (default: 1000)",
+    )
+    parser.add_argument(
+        "--spread",
+        type=float,
+        default=1.0,
+        help="Distance of the synthetic vectors to their topic (default: 1.0)",
+    )
+    parser.add_argument(
+        "--dtype",
+        default="float32",
+        choices=["float32", "float16"],
+        help="Vector precision (default: float32)",
+    )
+    parser.add_argument(
+        "--no-ivf",
+        dest="ivf",
+        action="store_false",
+        help="Scan all the vectors, without IVF lists",
+    )
+    parser.add_argument(
+        "--quantization",
+        default=None,
+        choices=quantization.KINDS,
+        help="Codes scanned instead of the vectors (default: none)",
+    )
+    parser.add_argument(
+        "--oversampling",
+        type=float,
+        default=4.0,
+        help="Candidates rescored with the vectors, times 10 (default: 4.0)",
+    )
+    parser.add_argument(
+        "--nlist",
+        type=int,
+        default=None,
+        help="IVF lists (default: the square root of the rows)",
+    )
+    parser.add_argument(
+        "--ivf-min-rows",
+        type=int,
+        default=10_000,
+        help="Rows from which the IVF lists are trained (default: 10000)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=4096,
+        help="Vectors per write (default: 4096)",
+    )
+    parser.add_argument(
+        "--nprobe",
+        type=int,
+        nargs="+",
+        default=[1, 4, 8, 16, 32, 64],
+        help="Lists probed per query (default: 1 4 8 16 32 64)",
+    )
+    parser.add_argument(
+        "--queries", type=int, default=200, help="Queries asked (default: 200)"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed (default: 0)")
+    parser.add_argument("--output", type=Path, help="Also write the JSON result here")
+    args = parser.parse_args()
+
+    result = {
+        "config": {
+            k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()
+        }
+    }
+    if args.store is None:
+        args.store = ANN_BENCHMARK / "-".join(
+            map(
+                str,
+                [
+                    "store",
+                    args.rows,
+                    args.dim,
+                    args.dtype,
+                    "ivf" if args.ivf else "flat",
+                    args.quantization or "full",
+                ],
+            )
+        )
+        result["build"] = build(args.store, args)
+    store = EmbeddedDocumentStore(
+        args.store, embedding_dim=args.dim, oversampling=args.oversampling
+    )
+    rng = np.random.default_rng(args.seed + 1)
+    rows = rng.choice(store.rows, min(args.queries, store.rows), replace=False)
+    queries = np.asarray(store._vectors[np.sort(rows)], dtype=np.float32)
+    # Near, not equal, to stored vectors
+    queries = unit(queries + noise(queries.shape, 0.2, rng))
+    result["nlist"] = len(store._centroids) if store._centroids is not None else None
+    result["quantization"] = store._quantized
+    result["footprint"] = footprint_mb(store)
+    result["search"] = measure(store, queries, args.nprobe)
+    result["memory_peak_mb"] = memory_peak_mb()
+    LOGGER.info("Result: %s", result)
+    output = json.dumps(result, indent=2)
+    if args.output:
+        args.output.write_text(output, encoding="utf-8")
+    print(output)  # noqa: T201
@@ -0,0 +1,163 @@
+"""Micro-batching of concurrent questions for the retrieving pipeline."""
+
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import math
+from typing import Any
+
+from haystack import Document, component
+from haystack.components.readers import ExtractiveReader
+from haystack.dataclasses import ExtractedAnswer
+
+LOGGER = logging.getLogger(__name__)
+
+
+@component
+class BatchExtractiveReader(ExtractiveReader):
+    """Extractive reader which can also answer several queries in one forward pass."""
+
+    def run_batch(
+        self,
+        queries: list[str],
+        documents: list[list[Document]],
+        top_k: int | None = None,
+    ) -> list[list[ExtractedAnswer]]:
+        """Return the answers of each query, from its own list of documents."""
+        import torch
+
+        if self.model is None:
+            raise RuntimeError("The reader was not warmed up.")
+        # Like `run`, queries without documents get no answers at all
+        answers: list[list[ExtractedAnswer]] = [[] for _ in queries]
+        present = [i for i, docs in enumerate(documents) if docs]
+        if not present:
+            return answers
+        queries = [queries[i] for i in present]
+        documents = [documents[i] for i in present]
+
+        answers_per_seq = self.answers_per_seq or 20
+        flattened_queries, flattened_documents, query_ids = self._flatten_documents(
+            queries, documents
+        )
+        input_ids, attention_mask, sequence_ids, encodings, query_ids, document_ids = (
+            self._preprocess(
+                queries=flattened_queries,
+                documents=flattened_documents,
+                max_seq_length=self.max_seq_length,
+                query_ids=query_ids,
+                stride=self.stride,
+            )
+        )
+        batch_size = self.max_batch_size or input_ids.shape[0]
+        start_logits = []
+        end_logits = []
+        for i in range(math.ceil(input_ids.shape[0] / batch_size)):
+            window = slice(i * batch_size, (i + 1) * batch_size)
+            with torch.inference_mode():
+                output = self.model(
+                    input_ids=input_ids[window], attention_mask=attention_mask[window]
+                )
+            start_logits.append(output.start_logits.cpu())
+            end_logits.append(output.end_logits.cpu())
+
+        start, end, probabilities = self._postprocess(
+            start=torch.cat(start_logits),
+            end=torch.cat(end_logits),
+            sequence_ids=sequence_ids,
+            attention_mask=attention_mask.cpu(),
+            answers_per_seq=answers_per_seq,
+            encodings=encodings,
+        )
+        # `_nest_answers` assumes `answers_per_seq` candidates in every sequence,
+        # but short sequences have fewer valid ones, which would shift the
+        # candidates of the next query onto this one. So nest each query apart.
+        nested = []
+        for position, query in enumerate(queries):
+            sequences = [s for s, q in enumerate(query_ids) if q == position]
+            if not sequences:
+                nested.append([])
+                continue
+            nested += self._nest_answers(
+                start=[start[s] for s in sequences],
+                end=[end[s] for s in sequences],
+                probabilities=probabilities[sequences],
+                flattened_documents=flattened_documents,
+                queries=[query],
+                answers_per_seq=answers_per_seq,
+                top_k=top_k or self.top_k,
+                score_threshold=self.score_threshold,
+                query_ids=[0] * len(sequences),
+                document_ids=[document_ids[s] for s in sequences],
+                no_answer=self.no_answer,
+                overlap_threshold=self.overlap_threshold,
+            )
+        for i, query_answers in zip(present, nested, strict=True):
+            answers[i] = query_answers
+        return answers
+
+
+class MicroBatcher:
+    """Group concurrent async requests into batches run in a worker pool.
+
+    A batch is flushed when it reaches `max_batch_size` or when its oldest
+    request has waited `max_wait` seconds, whichever comes first. `fn` gets
+    the list of items and returns one result per item.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[list[Any]], list[Any]],
+        max_batch_size: int = 16,
+        max_wait: float = 0.01,
+        workers: int = 1,
+    ):
+        """Create the batcher."""
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.workers = workers
+        self._pending: list[tuple[Any, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._tasks: set[asyncio.Future] = set()
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and wait for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="batch"
+            )
+        LOGGER.debug("Running a batch of %d request(s)", len(batch))
+        task = asyncio.get_running_loop().run_in_executor(
+            self._executor, self.fn, [item for item, _ in batch]
+        )
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: self._resolve(t, batch))
+
+    def _resolve(self, task: asyncio.Future, batch: list[tuple[Any, asyncio.Future]]):
+        self._tasks.discard(task)
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result()[i])
@@ -0,0 +1,371 @@
+"""Benchmark indexing and retrieval on a synthetic recipe corpus.
+
+Generates a corpus of one-chunk recipe files with labelled questions, indexes
+it with `indexing.Indexer` into an in-memory (or local) Qdrant or the embedded
+store and answers the questions with `retrieving.run`. Reports the indexing
+throughput, the query latency percentiles per stage, the peak memory and the
+recall@k as JSON.
+"""
+
+import argparse
+import json
+import logging
+from pathlib import Path
+import random
+import shutil
+import time
+
+from benchmark_stats import memory_peak_mb, percentiles
+from bm25 import BM25Index
+from embedded_store import EmbeddedDocumentStore
+from embedding_cache import EmbeddingCache
+from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
+import indexing
+import retrieving
+from stores import qdrant_quantization
+
+LOGGER = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+
+DIR = Path(__file__).resolve().parent
+BENCHMARK = DIR / ".cache" / "benchmark"
+
+SYLLABLES = "ba ko ri tan mel zu pi lor ven sa qui dro fe nu gal te".split()
+INGREDIENTS = """
+    eggplant tofu tomato basil garlic onion carrot celery lentils chickpeas
+    spinach kale mushroom zucchini pepper paprika cumin turmeric ginger lemon
+    lime coconut rice quinoa oats flour sugar cocoa vanilla cinnamon almonds
+    walnuts cashews raisins apple pear banana potato leek pumpkin beans corn
+    peas broccoli cauliflower cabbage miso soy tahini olives capers thyme
+    rosemary oregano parsley dill mint chili yeast salt
+""".split()
+
+
+def dish_name(i: int) -> str:
+    """Return a made-up dish name, unique for each `i`."""
+    syllables = []
+    while True:
+        i, digit = divmod(i, len(SYLLABLES))
+        syllables.append(SYLLABLES[digit])
+        if not i and len(syllables) >= 3:
+            break
+    return "".join(syllables).capitalize()
+
+
+def generate_corpus(path: Path, chunks: int, questions: int, seed: int = 0) -> list:
+    """Write `chunks` recipe files to `path` and return labelled questions.
+
+    Each file is short enough to be a single chunk. The corpus is reused if
+    it was already generated with the same parameters.
+    """
+    labels_path = path / "questions.json"
+    params_path = path / "corpus.json"
+    params = {"chunks": chunks, "questions": questions, "seed": seed}
+    if (
+        labels_path.exists()
+        and params_path.exists()
+        and json.loads(params_path.read_text(encoding="utf-8")) == params
+    ):
+        return json.loads(labels_path.read_text(encoding="utf-8"))
+    shutil.rmtree(path, ignore_errors=True)
+    rng = random.Random(seed)
+    asked = set(rng.sample(range(chunks), min(questions, chunks)))
+    labels = []
+    for i in range(chunks):
+        name = dish_name(i)
+        ingredients = rng.sample(INGREDIENTS, 6)
+        minutes = rng.randrange(10, 120, 5)
+        temperature = rng.randrange(150, 250, 10)
+        file = path / "files" / f"{i // 1000:04d}" / f"{i:07d}.txt"
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text(
+            f"{name}\n\n"
+            f"Ingredients: {', '.join(ingredients)}.\n\n"
+            f"Mix the {ingredients[0]} and the {ingredients[1]}, then add the rest. "
+            f"Bake the {name} at {temperature} degrees for {minutes} minutes "
+            "and serve warm.\n",
+            encoding="utf-8",
+        )
+        if i in asked:
+            labels.append(
+                {
+                    "question": f"How long do I bake the {name}?",
+                    "source_path": file.relative_to(path / "files").as_posix(),
+                    "answer": f"{minutes} minutes",
+                }
+            )
+        if (i + 1) % 100_000 == 0:
+            LOGGER.info("Generated %d/%d file(s)", i + 1, chunks)
+    labels_path.write_text(json.dumps(labels, indent=2), encoding="utf-8")
+    # Written last, an interrupted generation is not reused
+    params_path.write_text(json.dumps(params), encoding="utf-8")
+    return labels
+
+
+def document_store(
+    location: str,
+    store: str = "qdrant",
+    dtype: str = "float32",
+    nprobe: int | None = None,
+    quantization: str | None = None,
+) -> QdrantDocumentStore | EmbeddedDocumentStore:
+    """Return an empty store, Qdrant in memory, at a url or at a local path.
+
+    With `store` "embedded", the embedded store under the benchmark directory,
+    with IVF lists trained from the first chunk on if `nprobe` is given.
+    Either store keeps `quantization` codes if given.
+    """
+    if store == "embedded":
+        path = BENCHMARK / "vectors"
+        shutil.rmtree(path, ignore_errors=True)
+        return EmbeddedDocumentStore(
+            path,
+            embedding_dim=384,
+            dtype=dtype,
+            ivf=nprobe is not None,
+            nprobe=nprobe or 16,
+            ivf_min_rows=1,
+            quantization=quantization,
+        )
+    where = (
+        {"location": location}
+        if location == ":memory:" or location.startswith("http")
+        else {"path": location}
+    )
+    return QdrantDocumentStore(
+        **where,
+        index="benchmark",
+        embedding_dim=384,
+        similarity="cosine",
+        recreate_index=True,
+        quantization_config=qdrant_quantization(quantization),
+    )
+
+
+def run_indexing(
+    store: QdrantDocumentStore | EmbeddedDocumentStore,
+    corpus: Path,
+    work: Path,
+    args: argparse.Namespace,
+) -> dict:
+    """Index the corpus from scratch, with empty caches, and time it."""
+    shutil.rmtree(work, ignore_errors=True)
+    indexer = indexing.Indexer(
+        store,
+        BM25Index(work / "bm25"),
+        EmbeddingCache(
+            work / "embeddings",
+            model=indexing.EMBEDDING_MODEL,
+            dim=384,
+            max_entries=max(args.chunks, 1),
+        ),
+        workers=args.workers,
+    )
+
+    started = time.perf_counter()
+    written = indexer.index(
+        corpus / "files",
+        work / "manifest.json",
+        batch_size=args.batch_size,
+        pipelined=args.pipelined,
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        "chunks_written": written,
+        "seconds": elapsed,
+        "chunks_per_second": written / elapsed if elapsed else 0.0,
+        "memory_peak_mb": memory_peak_mb(),
+    }
+
+
+def run_queries(
+    store: QdrantDocumentStore | EmbeddedDocumentStore,
+    labels: list,
+    work: Path,
+    args: argparse.Namespace,
+) -> dict:
+    """Answer the labelled questions, timing each stage, and measure recall."""
+    service = retrieving.RetrievalService(
+        document_store=store,
+        bm25_path=work / "bm25",
+        hybrid=args.hybrid,
+        reader_backend=args.reader_backend,
+    )
+    retrieving.service = service
+    service.warm_up()
+    embedder = service.pipeline.get_component("embedder")
+    reader = service.pipeline.get_component("reader")
+
+    ks = sorted(set(args.k))
+    stages: dict[str, list[float]] = {
+        "embed": [],
+        "retrieve": [],
+        "read": [],
+        "end_to_end": [],
+    }
+    hits = dict.fromkeys(ks, 0)
+    answered = 0
+    # Top 10 of the IVF search also found by an exact one
+    ann_found = ann_expected = 0
+    for label in labels:
+        question = label["question"]
+
+        started = time.perf_counter()
+        embedding = embedder.run(text=question)["embedding"]
+        stages["embed"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        documents = service.retrieve(question, embedding, max(ks))
+        stages["retrieve"].append(time.perf_counter() - started)
+        sources = [d.meta.get("source_path") for d in documents]
+        for k in ks:
+            hits[k] += label["source_path"] in sources[:k]
+        if isinstance(store, EmbeddedDocumentStore) and (
+            store.ivf or store.quantization
+        ):
+            exact = {d.id for d in store.embedding_retrieval(embedding, exact=True)}
+            approximate = store.embedding_retrieval(embedding)
+            ann_found += len(exact & {d.id for d in approximate})
+            ann_expected += len(exact)
+
+        if args.no_reader:
+            continue
+        started = time.perf_counter()
+        answers = reader.run(
+            query=question, documents=documents[: args.top_k], top_k=1
+        )["answers"]
+        stages["read"].append(time.perf_counter() - started)
+        answered += bool(answers) and label["answer"] in (answers[0].data or "")
+
+        started = time.perf_counter()
+        retrieving.run(
+            {
+                "embedder": {"text": question},
+                "retriever": {"top_k": args.top_k},
+                "reader": {"query": question, "top_k": 1},
+            }
+        )
+        stages["end_to_end"].append(time.perf_counter() - started)
+
+    result = {
+        "questions": len(labels),
+        "stages": {name: percentiles(values) for name, values in stages.items()},
+        "recall_at_k": {str(k): hits[k] / len(labels) if labels else 0.0 for k in ks},
+        "memory_peak_mb": memory_peak_mb(),
+    }
+    if ann_expected:
+        result["approximate_recall_at_10"] = ann_found / ann_expected
+    if not args.no_reader:
+        result["answer_accuracy"] = answered / len(labels) if labels else 0.0
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--chunks",
+        type=int,
+        default=1000,
+        help="Number of chunks of the synthetic corpus (default: 1000)",
+    )
+    parser.add_argument(
+        "--questions",
+        type=int,
+        default=100,
+        help="Number of labelled questions asked (default: 100)",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the corpus (default: 0)"
+    )
+    parser.add_argument(
+        "--qdrant",
+        default=":memory:",
+        help="Qdrant stand-in: ':memory:', a url or a local path (default: :memory:)",
+    )
+    parser.add_argument(
+        "--store",
+        default="qdrant",
+        choices=["qdrant", "embedded"],
+        help="Document store benchmarked (default: qdrant)",
+    )
+    parser.add_argument(
+        "--store-dtype",
+        default="float32",
+        choices=["float32", "float16"],
+        help="Vector precision of the embedded store (default: float32)",
+    )
+    parser.add_argument(
+        "--nprobe",
+        type=int,
+        default=None,
+        help="Search the embedded store with IVF lists, probing this many",
+    )
+    parser.add_argument(
+        "--quantization",
+        default=None,
+        choices=["int8", "binary"],
+        help="Quantized codes searched instead of the vectors",
+    )
+    parser.add_argument(
+        "--k",
+        type=int,
+        nargs="+",
+        default=[1, 3, 5, 10],
+        help="Values of k for recall@k (default: 1 3 5 10)",
+    )
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        default=5,
+        help="Chunks passed to the reader (default: 5)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="Files per indexing batch (default: 32)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Conversion processes (default: 1)"
+    )
+    parser.add_argument(
+        "--pipelined", action="store_true", help="Use the pipelined indexing engine"
+    )
+    parser.add_argument(
+        "--hybrid", action="store_true", help="Fuse dense and BM25 retrieval"
+    )
+    parser.add_argument(
+        "--reader-backend",
+        default="torch",
+        choices=["torch", "onnx"],
+        help="Reader inference backend (default: torch)",
+    )
+    parser.add_argument(
+        "--no-reader",
+        action="store_true",
+        help="Only measure embedding, retrieval and recall",
+    )
+    parser.add_argument("--output", type=Path, help="Also write the JSON result here")
+    args = parser.parse_args()
+
+    corpus = BENCHMARK / f"corpus-{args.chunks}-{args.seed}"
+    labels = generate_corpus(corpus, args.chunks, args.questions, args.seed)
+    store = document_store(
+        args.qdrant, args.store, args.store_dtype, args.nprobe, args.quantization
+    )
+    work = BENCHMARK / "work"
+    result = {
+        "config": {
+            k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()
+        },
+        "indexing": run_indexing(store, corpus, work, args),
+        "queries": run_queries(store, labels, work, args),
+    }
+    LOGGER.info("Result: %s", result)
+    output = json.dumps(result, indent=2)
+    if args.output:
+        args.output.write_text(output, encoding="utf-8")
+    print(output)  # noqa: T201
@@ -0,0 +1,17 @@
+"""Statistics shared by the benchmarks, without importing any pipeline."""
+
+import resource
+
+import numpy as np
+
+
+def percentiles(values: list[float]) -> dict:
+    """Return the p50, p95 and p99 of latencies in seconds."""
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) if values else (None,) * 3
+    return {"p50": p50, "p95": p95, "p99": p99, "count": len(values)}
+
+
+def memory_peak_mb() -> float:
+    """Return the peak resident memory of the process so far."""
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
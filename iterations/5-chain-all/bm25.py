@@ -0,0 +1,285 @@
+"""On-disk BM25 inverted index for sparse retrieval next to the dense one."""
+
+from collections import Counter
+import json
+import logging
+import math
+from pathlib import Path
+import re
+import shutil
+import threading
+import time
+from typing import Any
+
+from haystack import Document, component
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+TOKEN = re.compile(r"\w+", re.UNICODE)
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has in is it of on or that the this to "
+    "was were with".split()
+)
+# Seconds to wait for `save` to swap a new index in
+SWAP_TIMEOUT = 5.0
+
+
+def tokenize(text: str) -> list[str]:
+    """Split a text into lowercase terms, without stop words."""
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOP_WORDS]
+
+
+class BM25Index:
+    """BM25 index stored as compressed sparse rows of NumPy arrays.
+
+    For each term, the postings hold the indices of the chunks containing it
+    and its frequency in them. The arrays are memory-mapped read-only, the
+    vocabulary and the chunk ids live in a JSON sidecar. Updates are buffered
+    with `add` and `remove` (by `meta.source_path`) and merged into the arrays
+    by `save`, which writes a new directory and swaps it in.
+    """
+
+    def __init__(self, path: Path, k1: float = 1.5, b: float = 0.75):
+        """Open the index stored in the directory `path`, if it exists."""
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._added: dict[str, tuple[str, Counter]] = {}
+        self._removed: set[str] = set()
+        self._mtime: int | None = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        while self._swapped_in():
+            try:
+                return self._read()
+            except FileNotFoundError:
+                # Another save swapped the directories meanwhile
+                continue
+        self.terms: dict[str, int] = {}
+        self.ids: list[str] = []
+        self.sources: list[str] = []
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings = np.zeros(0, dtype=np.int32)
+        self.frequencies = np.zeros(0, dtype=np.uint16)
+        self.lengths = np.zeros(0, dtype=np.int32)
+        self._norm = np.zeros(0, dtype=np.float32)
+        self._mtime = None
+
+    def _swapped_in(self) -> bool:
+        """Return whether the index exists on disk.
+
+        Between the two renames of `save` swapping the directories, only the
+        old directory exists: wait for the new one rather than loading an
+        empty index.
+        """
+        old = self.path.with_name(self.path.name + ".old")
+        deadline = time.monotonic() + SWAP_TIMEOUT
+        while not (self.path / "meta.json").exists():
+            if not old.exists() or time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _read(self):
+        """Read the vocabulary and the ids, and map the arrays."""
+        meta_path = self.path / "meta.json"
+        self._mtime = meta_path.stat().st_mtime_ns
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        self.terms = {t: i for i, t in enumerate(meta["terms"])}
+        self.ids = meta["ids"]
+        self.sources = meta["sources"]
+        for name in ("offsets", "postings", "frequencies", "lengths"):
+            setattr(self, name, np.load(self.path / f"{name}.npy", mmap_mode="r"))
+        # Length normalization of each chunk, the only per-chunk part of BM25
+        lengths = np.asarray(self.lengths, dtype=np.float32)
+        average = float(lengths.mean()) if len(lengths) else 1.0
+        self._norm = self.k1 * (1 - self.b + self.b * lengths / max(average, 1.0))
+        LOGGER.info(
+            "BM25 index with %d chunk(s) and %d term(s) at %s",
+            len(self),
+            len(self.terms),
+            self.path,
+        )
+
+    def __len__(self) -> int:
+        """Return the number of indexed chunks."""
+        return len(self.ids)
+
+    def refresh(self):
+        """Reload the index if another process saved a new version."""
+        try:
+            mtime = (self.path / "meta.json").stat().st_mtime_ns
+        except FileNotFoundError:
+            # Removed, or being swapped: `_load` waits for the swap
+            mtime = None
+        if mtime != self._mtime:
+            with self._lock:
+                self._load()
+
+    def add(self, documents: list[Document]):
+        """Queue chunks to be added on the next `save`."""
+        with self._lock:
+            for doc in documents:
+                self._added[doc.id] = (
+                    doc.meta.get("source_path", ""),
+                    Counter(tokenize(doc.content or "")),
+                )
+
+    def remove(self, sources: list[str]):
+        """Queue the removal of all chunks of the given files on the next `save`."""
+        with self._lock:
+            self._removed.update(sources)
+            self._added = {
+                k: v for k, v in self._added.items() if v[0] not in self._removed
+            }
+
+    def save(self):
+        """Merge the pending changes into the arrays and write them to disk."""
+        with self._lock:
+            if not self._added and not self._removed:
+                return
+            keep = np.array(
+                [
+                    s not in self._removed and i not in self._added
+                    for i, s in zip(self.ids, self.sources, strict=True)
+                ],
+                dtype=bool,
+            )
+            # Postings of the kept chunks as (term, chunk, frequency) triples
+            term_ids = np.repeat(
+                np.arange(len(self.offsets) - 1, dtype=np.int64), np.diff(self.offsets)
+            )
+            kept = keep[self.postings] if len(self.postings) else keep[:0]
+            remap = np.cumsum(keep, dtype=np.int64) - 1
+            triples = [
+                (term_ids[kept], remap[self.postings[kept]], self.frequencies[kept])
+            ]
+            ids = [i for i, k in zip(self.ids, keep, strict=True) if k]
+            sources = [s for s, k in zip(self.sources, keep, strict=True) if k]
+            lengths = [np.asarray(self.lengths)[keep]]
+
+            terms = dict(self.terms)
+            new_terms, new_docs, new_freqs, new_lengths = [], [], [], []
+            for doc_id, (source, counts) in self._added.items():
+                doc = len(ids)
+                ids.append(doc_id)
+                sources.append(source)
+                new_lengths.append(sum(counts.values()))
+                for term, count in counts.items():
+                    new_terms.append(terms.setdefault(term, len(terms)))
+                    new_docs.append(doc)
+                    new_freqs.append(min(count, np.iinfo(np.uint16).max))
+            triples.append(
+                (
+                    np.asarray(new_terms, dtype=np.int64),
+                    np.asarray(new_docs, dtype=np.int64),
+                    np.asarray(new_freqs, dtype=np.uint16),
+                )
+            )
+            lengths.append(np.asarray(new_lengths, dtype=np.int32))
+
+            term_col, doc_col, freq_col = (
+                np.concatenate([t[i] for t in triples]) for i in range(3)
+            )
+            # Drop the terms left without postings by removed chunks
+            counts = np.bincount(term_col, minlength=len(terms))
+            used = counts > 0
+            term_col = (np.cumsum(used) - 1)[term_col]
+            terms = [t for t, u in zip(terms, used, strict=True) if u]
+            order = np.lexsort((doc_col, term_col))
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            np.cumsum(counts[used], out=offsets[1:])
+
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            shutil.rmtree(tmp, ignore_errors=True)
+            tmp.mkdir(parents=True)
+            np.save(tmp / "offsets.npy", offsets)
+            np.save(tmp / "postings.npy", doc_col[order].astype(np.int32))
+            np.save(tmp / "frequencies.npy", freq_col[order].astype(np.uint16))
+            np.save(tmp / "lengths.npy", np.concatenate(lengths).astype(np.int32))
+            (tmp / "meta.json").write_text(
+                json.dumps({"terms": terms, "ids": ids, "sources": sources}),
+                encoding="utf-8",
+            )
+            old = self.path.with_name(self.path.name + ".old")
+            shutil.rmtree(old, ignore_errors=True)
+            if self.path.exists():
+                self.path.rename(old)
+            tmp.rename(self.path)
+            shutil.rmtree(old, ignore_errors=True)
+
+            self._added.clear()
+            self._removed.clear()
+            self._load()
+
+    def search(self, query: str, top_k: int = 10) -> list[tuple[str, float]]:
+        """Return the ids and BM25 scores of the best matching chunks."""
+        self.refresh()
+        with self._lock:
+            n = len(self.ids)
+            if not n:
+                return []
+            scores = np.zeros(n, dtype=np.float32)
+            for term in set(tokenize(query)):
+                if (t := self.terms.get(term)) is None:
+                    continue
+                start, end = self.offsets[t], self.offsets[t + 1]
+                docs = self.postings[start:end]
+                tf = self.frequencies[start:end].astype(np.float32)
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._norm[docs])
+            top_k = min(top_k, int(np.count_nonzero(scores)))
+            if not top_k:
+                return []
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            best = best[np.argsort(-scores[best])]
+            return [(self.ids[i], float(scores[i])) for i in best]
+
+
+@component
+class BM25Writer:
+    """Add the chunks passing through to a BM25 index, for the indexing pipeline."""
+
+    def __init__(self, index: BM25Index):
+        """Create the component writing to `index`."""
+        self.index = index
+
+    @component.output_types(documents=list[Document])
+    def run(self, documents: list[Document]) -> dict[str, Any]:
+        """Queue the chunks in the index and pass them on unchanged."""
+        self.index.add(documents)
+        return {"documents": documents}
+
+
+@component
+class BM25Retriever:
+    """Retrieve chunks matching the query terms from a BM25 index.
+
+    The index only holds ids, the chunks are fetched from `document_store`.
+    """
+
+    def __init__(self, index: BM25Index, document_store: Any, top_k: int = 10):
+        """Create the retriever."""
+        self.index = index
+        self.document_store = document_store
+        self.top_k = top_k
+
+    @component.output_types(documents=list[Document])
+    def run(self, query: str, top_k: int | None = None) -> dict[str, Any]:
+        """Return the best matching chunks, best first."""
+        hits = self.index.search(query, top_k or self.top_k)
+        if not hits:
+            return {"documents": []}
+        found = {
+            d.id: d
+            for d in self.document_store.get_documents_by_id([i for i, _ in hits])
+        }
+        documents = []
+        for doc_id, score in hits:
+            if (doc := found.get(doc_id)) is not None:
+                doc.score = score
+                documents.append(doc)
+        return {"documents": documents}
@@ -1,19 +1,20 @@
 """Client for the ask file tool using Haystack MCP integration."""
 
+from collections.abc import Callable, Iterator
 import logging
 from pathlib import Path
+import queue
+import threading
 
+import component_tracing
 import dotenv
 from haystack import Pipeline
 from haystack.components.converters import OutputAdapter
 from haystack.components.generators.chat import OpenAIChatGenerator
+from haystack.components.routers import ConditionalRouter
 from haystack.components.tools import ToolInvoker
-from haystack.dataclasses import ChatMessage
-from haystack_integrations.tools.mcp import (
-    MCPToolset,
-    SSEServerInfo,
-    StreamableHttpServerInfo,
-)
+from haystack.dataclasses import ChatMessage, StreamingChunk
+from mcp_pool import MCPSessionPool, PooledMCPToolset
 
 DIR = Path(__file__).resolve().parent
 
@@ -25,31 +26,81 @@ logging.basicConfig(
 
 
 dotenv.load_dotenv()
+# TRACE_FILE and/or TRACE_OTEL, see component_tracing.py
+component_tracing.enable_from_env()
 
 llm = OpenAIChatGenerator(
     model="gpt-4o-mini",
 )
 
-# Create server info for the time service (can also use SSEServerInfo for remote servers)
-server_info_sse = SSEServerInfo(
-    url="http://localhost:8000/sse"
-)  # Fallback to SSE if StreamableHttpServerInfo is not available
-server_info_streamable = StreamableHttpServerInfo(url="http://localhost:8000/mcp")
-
-# Create the toolset - this will automatically discover all available tools
-# You can optionally specify which tools to include
-mcp_toolset = MCPToolset(
-    # server_info=server_info_sse,
-    server_info=server_info_streamable,
-)
+# Persistent sessions to the tool server, the tool list is fetched once and
+# refreshed only when the server notifies a change
+mcp_pool = MCPSessionPool(url="http://localhost:8000/mcp")
+mcp_toolset = PooledMCPToolset(mcp_pool)
 
 stream_callback = lambda x: LOGGER.info("Streamed response: %s", x)
 
+
+class FirstReplyStream:
+    """Stream the text of the first reply, but only if it calls no tool.
+
+    A model may write some text before calling a tool, which must not be shown
+    ahead of the answer built from the tool results. So the text chunks are
+    held until the reply finishes, and dropped if it called a tool. A new
+    instance is needed per run.
+    """
+
+    def __init__(self, cb: Callable[[StreamingChunk], None]):
+        """Forward the text of a reply without tool calls to `cb`."""
+        self.cb = cb
+        self.tool_called = False
+        self._held: list[StreamingChunk] = []
+
+    def __call__(self, chunk: StreamingChunk):
+        """Hold a text chunk, forward the held ones once the reply finished."""
+        if chunk.tool_calls or chunk.finish_reason == "tool_calls":
+            self.tool_called = True
+            self._held.clear()
+        elif chunk.content and not self.tool_called:
+            self._held.append(chunk)
+        if chunk.finish_reason is not None:
+            self.flush()
+
+    def flush(self):
+        """Forward the held chunks, unless a tool was called."""
+        held, self._held = self._held, []
+        if not self.tool_called:
+            for chunk in held:
+                self.cb(chunk)
+
+
+# The first reply is streamed as well, see `FirstReplyStream`: without tool
+# calls, it is the answer and the tools and the response llm are skipped
+routes = [
+    {
+        "condition": "{{ replies | length > 0 and replies[0].tool_calls | length > 0 }}",
+        "output": "{{ replies }}",
+        "output_name": "tool_calls",
+        "output_type": list[ChatMessage],
+    },
+    {
+        "condition": "{{ replies | length == 0 or replies[0].tool_calls | length == 0 }}",
+        "output": "{{ replies }}",
+        "output_name": "replies",
+        "output_type": list[ChatMessage],
+    },
+]
+
 # Create a pipeline with the toolset
 client_pipeline = Pipeline()
 client_pipeline.add_component(
-    "llm", OpenAIChatGenerator(model="gpt-4o-mini", tools=mcp_toolset)
+    "llm",
+    OpenAIChatGenerator(
+        model="gpt-4o-mini",
+        tools=mcp_toolset,
+    ),
 )
+client_pipeline.add_component("router", ConditionalRouter(routes, unsafe=True))
 client_pipeline.add_component("tool_invoker", ToolInvoker(tools=mcp_toolset))
 client_pipeline.add_component(
     "adapter",
@@ -65,8 +116,9 @@ client_pipeline.add_component(
         model="gpt-4o-mini", streaming_callback=lambda x: stream_callback(x)
     ),
 )
-client_pipeline.connect("llm.replies", "tool_invoker.messages")
-client_pipeline.connect("llm.replies", "adapter.initial_tool_messages")
+client_pipeline.connect("llm.replies", "router.replies")
+client_pipeline.connect("router.tool_calls", "tool_invoker.messages")
+client_pipeline.connect("router.tool_calls", "adapter.initial_tool_messages")
 client_pipeline.connect("tool_invoker.tool_messages", "adapter.tool_messages")
 client_pipeline.connect("adapter.output", "response_llm.messages")
 
@@ -79,6 +131,51 @@ def get_pipeline() -> Pipeline:
 
 
 def set_stream_callback(cb):
-    """Set the stream callback."""
+    """Set the stream callback used by runs without their own callback."""
     global stream_callback  # noqa: PLW0603
     stream_callback = cb
+
+
+def run(
+    messages: list[ChatMessage],
+    streaming_callback: Callable[[StreamingChunk], None] | None = None,
+) -> dict:
+    """Run the pipeline, streaming the response to this run's own callback.
+
+    The callback is passed as a run input instead of being shared by all
+    runs, so several sessions can stream concurrently. The final replies are
+    in `router.replies` if no tool was called, else in `response_llm.replies`.
+    """
+    if streaming_callback is None:
+        streaming_callback = lambda x: stream_callback(x)
+    first_reply = FirstReplyStream(streaming_callback)
+    result = client_pipeline.run(
+        {
+            "llm": {"messages": messages, "streaming_callback": first_reply},
+            "adapter": {"initial_msg": messages[-1:]},
+            "response_llm": {"streaming_callback": streaming_callback},
+        }
+    )
+    # In case the last chunk did not tell that the reply finished
+    first_reply.flush()
+    return result
+
+
+def run_streaming(messages: list[ChatMessage]) -> Iterator[StreamingChunk]:
+    """Run the pipeline in a thread and yield the streamed chunks."""
+    chunks: queue.Queue = queue.Queue()
+    error: list[BaseException] = []
+
+    def target():
+        try:
+            run(messages, chunks.put)
+        except BaseException as e:
+            error.append(e)
+        finally:
+            chunks.put(None)
+
+    threading.Thread(target=target, name="client-run", daemon=True).start()
+    while (chunk := chunks.get()) is not None:
+        yield chunk
+    if error:
+        raise error[0]
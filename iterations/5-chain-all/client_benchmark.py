@@ -0,0 +1,88 @@
+"""Benchmark the client pipeline with several simultaneous chats."""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import importlib.util
+import json
+import logging
+from pathlib import Path
+import statistics
+import sys
+import time
+
+from haystack.dataclasses import ChatMessage
+
+LOGGER = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+
+DIR = Path(__file__).resolve().parent
+
+# Load module from file
+spec = importlib.util.spec_from_file_location("client_pipeline", DIR / "client.py")
+client_pipeline = importlib.util.module_from_spec(spec)
+sys.modules["client_pipeline"] = client_pipeline
+spec.loader.exec_module(client_pipeline)
+
+
+def chat(question: str) -> dict:
+    """Run one chat turn and measure its latencies."""
+    started = time.perf_counter()
+    first_chunk = None
+    chunks = 0
+    for _ in client_pipeline.run_streaming([ChatMessage.from_user(question)]):
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - started
+        chunks += 1
+    return {
+        "first_chunk": first_chunk,
+        "total": time.perf_counter() - started,
+        "chunks": chunks,
+    }
+
+
+def benchmark(question: str, concurrency: int, rounds: int) -> dict:
+    """Run `rounds` chats for each of `concurrency` simultaneous sessions."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(chat, [question] * concurrency * rounds))
+    elapsed = time.perf_counter() - started
+    totals = [r["total"] for r in results]
+    first_chunks = [r["first_chunk"] for r in results if r["first_chunk"] is not None]
+    return {
+        "concurrency": concurrency,
+        "chats": len(results),
+        "seconds": elapsed,
+        "chats_per_second": len(results) / elapsed,
+        "chunks_per_second": sum(r["chunks"] for r in results) / elapsed,
+        "p50_total": statistics.median(totals),
+        "p50_first_chunk": statistics.median(first_chunks) if first_chunks else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8],
+        help="Numbers of simultaneous chats to measure (default: 1 2 4 8)",
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=2, help="Chats per session (default: 2)"
+    )
+    parser.add_argument(
+        "--question",
+        default="What do I need for a vegan lasagna?",
+        help="Question asked in every chat",
+    )
+    args = parser.parse_args()
+
+    results = []
+    for concurrency in args.concurrency:
+        results.append(benchmark(args.question, concurrency, args.rounds))
+        LOGGER.info("Result: %s", results[-1])
+    print(json.dumps(results, indent=2))  # noqa: T201
@@ -0,0 +1,190 @@
+"""Per-component timing spans for the Haystack pipelines.
+
+Haystack opens a span for every pipeline and component run through its
+`tracing.tracer`, which does nothing until a tracer is enabled. The
+`TimingTracer` enabled here records for each span the wall and CPU time, the
+sizes of the inputs and outputs (list lengths, text lengths, never the
+content) and the batch size, i.e. the longest list input. Spans are appended
+as JSON lines shaped like OpenTelemetry spans and/or forwarded to an
+OpenTelemetry tracer configured by the usual `OTEL_*` environment variables.
+"""
+
+from collections.abc import Iterator
+import contextlib
+from contextvars import ContextVar
+import json
+import logging
+import os
+from pathlib import Path
+import secrets
+import threading
+import time
+from typing import Any
+
+from haystack import tracing
+
+LOGGER = logging.getLogger(__name__)
+
+# Content tags set by Haystack around component runs
+_INPUT = "haystack.component.input"
+_OUTPUT = "haystack.component.output"
+# Socket descriptions, the same for every run of a component
+_SPECS = ("haystack.component.input_spec", "haystack.component.output_spec")
+
+
+def sizes(values: Any) -> dict[str, int]:
+    """Return the length of each sized value of a dict of inputs or outputs."""
+    if not isinstance(values, dict):
+        return {}
+    return {k: len(v) for k, v in values.items() if hasattr(v, "__len__")}
+
+
+class TimingSpan(tracing.Span):
+    """Span collecting its tags, mirrored to an optional inner span."""
+
+    def __init__(
+        self,
+        name: str,
+        parent: "TimingSpan | None",
+        inner: tracing.Span | None,
+    ):
+        """Create a span, child of `parent` if given."""
+        self.name = name
+        self.inner = inner
+        self.tags: dict[str, Any] = {}
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+
+    def set_tag(self, key: str, value: Any):
+        """Set a tag on the span and on the inner span."""
+        self.tags[key] = value
+        if self.inner is not None:
+            self.inner.set_tag(key, value)
+
+    def set_content_tag(self, key: str, value: Any):
+        """Record the sizes of the inputs or outputs, not their content."""
+        if key == _INPUT:
+            input_sizes = sizes(value)
+            self.set_tag("input_sizes", input_sizes)
+            lists = [len(v) for v in value.values() if isinstance(v, list)]
+            if lists:
+                self.set_tag("batch_size", max(lists))
+        elif key == _OUTPUT:
+            self.set_tag("output_sizes", sizes(value))
+        if self.inner is not None:
+            self.inner.set_content_tag(key, value)
+
+    def raw_span(self) -> Any:
+        """Return the inner span if any, else this one."""
+        return self.inner.raw_span() if self.inner is not None else self
+
+    def to_dict(self, start: int, end: int) -> dict:
+        """Return the span in the shape of an OpenTelemetry span."""
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_time_unix_nano": start,
+            "end_time_unix_nano": end,
+            "attributes": {k: v for k, v in self.tags.items() if k not in _SPECS},
+        }
+
+
+class TimingTracer(tracing.Tracer):
+    """Tracer timing each span, writing to `path` and/or an `inner` tracer.
+
+    The CPU time of a span is `time.thread_time`, the CPU time of the thread
+    running it only. The work a component hands to other threads or processes,
+    like torch intra-op threads, the conversion processes or the upserts of
+    the bulk writer, is not included: a `cpu_seconds` well below
+    `wall_seconds` means waiting or offloaded work.
+    """
+
+    def __init__(self, path: Path | None = None, inner: tracing.Tracer | None = None):
+        """Create the tracer, appending to `path` if given."""
+        self.path = path
+        self.inner = inner
+        self._current: ContextVar[TimingSpan | None] = ContextVar(
+            "current_span", default=None
+        )
+        self._lock = threading.Lock()
+        self._file = None
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = path.open("a", encoding="utf-8")
+
+    @contextlib.contextmanager
+    def trace(
+        self,
+        operation_name: str,
+        tags: dict[str, Any] | None = None,
+        parent_span: tracing.Span | None = None,
+    ) -> Iterator[TimingSpan]:
+        """Time the block of code in a new span."""
+        parent = parent_span if isinstance(parent_span, TimingSpan) else None
+        parent = parent or self._current.get()
+        inner_parent = parent.inner if parent is not None else None
+        with (
+            self.inner.trace(operation_name, tags, parent_span=inner_parent)
+            if self.inner is not None
+            else contextlib.nullcontext()
+        ) as inner:
+            span = TimingSpan(operation_name, parent, inner)
+            span.tags.update(tags or {})
+            token = self._current.set(span)
+            start = time.time_ns()
+            wall = time.perf_counter()
+            cpu = time.thread_time()
+            try:
+                yield span
+            except BaseException as e:
+                span.set_tag("error", repr(e))
+                raise
+            finally:
+                span.set_tag("wall_seconds", time.perf_counter() - wall)
+                span.set_tag("cpu_seconds", time.thread_time() - cpu)
+                self._current.reset(token)
+                self._export(span.to_dict(start, time.time_ns()))
+
+    def current_span(self) -> TimingSpan | None:
+        """Return the span of the running block, if any."""
+        return self._current.get()
+
+    def _export(self, record: dict):
+        if self._file is None:
+            return
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        """Close the output file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def enable(path: Path | None = None, otel: bool = False) -> TimingTracer:
+    """Trace all pipelines to the JSON lines file `path` and/or OpenTelemetry."""
+    inner = None
+    if otel:
+        from haystack.tracing.opentelemetry import OpenTelemetryTracer
+        import opentelemetry.trace
+
+        inner = OpenTelemetryTracer(opentelemetry.trace.get_tracer("chat2files"))
+    tracer = TimingTracer(path, inner)
+    tracing.enable_tracing(tracer)
+    LOGGER.info("Tracing pipelines to %s", path or "OpenTelemetry")
+    return tracer
+
+
+def enable_from_env() -> TimingTracer | None:
+    """Enable tracing if `TRACE_FILE` or `TRACE_OTEL` is set."""
+    path = os.environ.get("TRACE_FILE")
+    otel = os.environ.get("TRACE_OTEL", "").lower() in ("1", "true", "yes")
+    if not path and not otel:
+        return None
+    return enable(Path(path) if path else None, otel)
@@ -0,0 +1,93 @@
+"""Parallel file conversion using a process pool."""
+
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import os
+from pathlib import Path
+from typing import Optional, Union
+
+from haystack import Document, component
+from haystack.components.converters import (
+    MarkdownToDocument,
+    PyPDFToDocument,
+    TextFileToDocument,
+)
+from haystack.dataclasses import ByteStream
+
+LOGGER = logging.getLogger(__name__)
+
+CONVERTERS = {
+    "text/plain": TextFileToDocument,
+    "application/pdf": PyPDFToDocument,
+    "text/markdown": lambda: MarkdownToDocument(progress_bar=False),
+}
+
+# Converters are created once per worker process
+_converters = {}
+
+
+def convert(mime_type: str, source: str | Path | ByteStream) -> list[Document]:
+    """Convert a single source with the converter of its mime type.
+
+    The entry point of the worker processes, which only import this module.
+    """
+    if mime_type not in _converters:
+        _converters[mime_type] = CONVERTERS[mime_type]()
+    return _converters[mime_type].run(sources=[source])["documents"]
+
+
+@component
+class ParallelConverter:
+    """Convert the sources routed by `FileTypeRouter` in a pool of processes.
+
+    Documents are returned in a deterministic order: grouped by mime type
+    (text, pdf, markdown), then in the order of the sources. With one worker,
+    sources are converted in-process.
+    """
+
+    def __init__(self, workers: int | None = None):
+        """Create the converter with `workers` processes (default: cpu count)."""
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: ProcessPoolExecutor | None = None
+
+    def warm_up(self):
+        """Start the worker processes."""
+        if self.workers > 1 and self._executor is None:
+            # Spawn, so that workers don't inherit the embedding model or threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            LOGGER.info("Started %d conversion worker(s)", self.workers)
+
+    def close(self):
+        """Shut down the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @component.output_types(documents=list[Document])
+    def run(
+        self,
+        # Haystack does not match `X | None` sockets against the router outputs
+        text_sources: Optional[list[Union[str, Path, ByteStream]]] = None,  # noqa: UP007
+        pdf_sources: Optional[list[Union[str, Path, ByteStream]]] = None,  # noqa: UP007
+        markdown_sources: Optional[list[Union[str, Path, ByteStream]]] = None,  # noqa: UP007
+    ):
+        """Convert the sources to documents."""
+        mime_types = []
+        sources = []
+        for mime_type, group in (
+            ("text/plain", text_sources),
+            ("application/pdf", pdf_sources),
+            ("text/markdown", markdown_sources),
+        ):
+            mime_types += [mime_type] * len(group or [])
+            sources += group or []
+
+        if self._executor is None:
+            results = map(convert, mime_types, sources)
+        else:
+            results = self._executor.map(convert, mime_types, sources)
+        return {"documents": [doc for docs in results for doc in docs]}
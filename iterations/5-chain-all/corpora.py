@@ -0,0 +1,50 @@
+"""Corpora, the file shares of the tenants served by one tool server.
+
+Each corpus is indexed on its own: its chunks go to the Qdrant collection (or
+embedded store) named after it, next to its own BM25 index and manifest for
+each store, so a question only ever sees the chunks of the corpora it asks
+for. The models are shared by all of them.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+import re
+
+DIR = Path(__file__).resolve().parent
+CACHE = DIR / ".cache"
+# The corpus of the examples, named after this iteration
+DEFAULT = "5-chain-all"
+# Usable as a Qdrant collection and as a file name
+NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+
+
+@dataclass(frozen=True)
+class Corpus:
+    """Names of the collection and of the local files of a corpus."""
+
+    name: str = DEFAULT
+
+    def __post_init__(self):
+        """Reject names which are not safe as collection and file names."""
+        if not NAME.fullmatch(self.name):
+            raise ValueError(f"Invalid corpus name: {self.name!r}")
+
+    @property
+    def index(self) -> str:
+        """Return the Qdrant collection."""
+        return self.name
+
+    def bm25(self, store: str = "qdrant") -> Path:
+        """Return the directory of the BM25 index of the chunks in `store`."""
+        suffix = "" if store == "qdrant" else f"-{store}"
+        return CACHE / f"bm25-{self.name}{suffix}"
+
+    @property
+    def embedded_store(self) -> Path:
+        """Return the directory of the embedded store."""
+        return CACHE / f"vectors-{self.name}"
+
+    def manifest(self, store: str = "qdrant") -> Path:
+        """Return the manifest of the files indexed in the `store` backend."""
+        suffix = "" if store == "qdrant" else f"-{store}"
+        return CACHE / f"manifest-{self.name}{suffix}.json"
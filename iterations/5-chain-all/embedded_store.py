@@ -0,0 +1,645 @@
+"""Embedded document store: memory-mapped vectors searched in process with NumPy.
+
+A stand-in for Qdrant for small and medium corpora, without a service to run
+and without a network round trip per query.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+import threading
+import time
+from typing import Any
+
+from haystack import Document, component, default_from_dict, default_to_dict
+from haystack.document_stores.errors import DuplicateDocumentError
+from haystack.document_stores.types import DuplicatePolicy
+from haystack.utils.filters import document_matches_filter
+import ivf
+import numpy as np
+import quantization
+
+LOGGER = logging.getLogger(__name__)
+
+# Rows scored at once: the float32 copy of a block of float16 vectors stays
+# in the CPU cache
+BLOCK_ROWS = 8192
+# Seconds a reader waits for a compaction to swap in the new directory
+SWAP_TIMEOUT = 5.0
+
+QUANTIZATIONS = quantization.KINDS
+
+
+class EmbeddedDocumentStore:
+    """Document store keeping unit-normalized embeddings in a memory-mapped matrix.
+
+    The directory `path` holds raw append-only files: the vectors as `dtype`
+    (float32, or float16 for half the size but slower scans, as NumPy converts
+    them back to float32 block by block), the documents as JSON lines with
+    their byte offsets, and the id and `meta.source_path` of each row. The
+    committed number of rows and the deleted rows are recorded in `meta.json`,
+    rewritten atomically after each write, so other processes see a
+    consistent store and reload it when it changes. Deleted rows are
+    compacted away once they exceed `compact_ratio` of the rows.
+
+    Searching is an exact cosine similarity scan in blocks of rows. With
+    `ivf`, once the store holds `ivf_min_rows` documents, the vectors are
+    clustered into `nlist` lists (default: the square root of the rows) and
+    a search only scans the `nprobe` lists closest to the query, see `ivf`.
+    The centroids are trained when the store is compacted, which also groups
+    the rows by list, and retrained when the store has grown fourfold; the
+    list of each new row is appended with it. A higher `nprobe` trades
+    latency for recall.
+
+    With `quantization` ("int8" or "binary", set when the store is created or
+    applied by the next compaction), the scans read compact codes of the
+    vectors instead, see `quantization`, and the `oversampling` times
+    `top_k` best candidates are rescored with the full vectors. Only the codes
+    need to stay in memory, the full vectors are read for the candidates.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        embedding_dim: int = 384,
+        dtype: str = "float32",
+        compact_ratio: float = 0.25,
+        ivf: bool = False,
+        nlist: int | None = None,
+        nprobe: int = 16,
+        ivf_min_rows: int = 10_000,
+        quantization: str | None = None,
+        oversampling: float = 4.0,
+    ):
+        """Open the store in the directory `path`, created on the first write."""
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        if quantization not in (None, *QUANTIZATIONS):
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.path = Path(path)
+        self.embedding_dim = embedding_dim
+        self.dtype = dtype
+        self.compact_ratio = compact_ratio
+        self.ivf = ivf
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ivf_min_rows = ivf_min_rows
+        self.quantization = quantization
+        self.oversampling = oversampling
+        self.keys_size = 0
+        self._mtime: int | None = None
+        self._inode: int | None = None
+        self._fd: int | None = None
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        """Load the committed rows, only the new ones if the files were appended to."""
+        meta_path = self.path / "meta.json"
+        meta = self._read_meta()
+        keys_path = self.path / "keys.jsonl"
+        inode = keys_path.stat().st_ino if meta and keys_path.exists() else None
+        appended = (
+            meta is not None
+            and inode == self._inode
+            and meta["keys_size"] >= self.keys_size
+        )
+        if not appended:
+            # New store, or compacted: the files were replaced
+            self.close()
+            self.rows = 0
+            self.keys_size = 0
+            self.ids: list[str] = []
+            self.sources: list[str] = []
+            self.deleted: set[int] = set()
+            self._rows: dict[str, int] = {}
+            self._by_source: dict[str, list[int]] = {}
+            self._alive = np.zeros(0, dtype=bool)
+            self._centroids: np.ndarray | None = None
+            self._trained_rows: int | None = None
+            self._inverted: ivf.InvertedLists | None = None
+            # Kind and scale of the stored codes
+            self._quantized: str | None = None
+            self._scale: float | None = None
+        self._inode = inode
+        if meta is None:
+            self._mtime = None
+            self._remap()
+            return
+        self._mtime = meta_path.stat().st_mtime_ns
+        if meta["dim"] != self.embedding_dim:
+            raise ValueError(
+                f"{self.path} holds {meta['dim']}-dim vectors, not {self.embedding_dim}"
+            )
+        if meta["dtype"] != self.dtype:
+            LOGGER.warning(
+                "%s stores %s vectors, not %s", self.path, meta["dtype"], self.dtype
+            )
+            self.dtype = meta["dtype"]
+        if meta.get("ivf") and self._centroids is None:
+            self.ivf = True
+            self._trained_rows = meta["ivf"]["trained_rows"]
+            self._centroids = np.load(self.path / "centroids.npy")
+        if meta.get("quantization") and self._quantized is None:
+            self._quantized = meta["quantization"]["kind"]
+            self._scale = meta["quantization"]["scale"]
+            if self.quantization not in (None, self._quantized):
+                LOGGER.warning(
+                    "%s stores %s codes, not %s",
+                    self.path,
+                    self._quantized,
+                    self.quantization,
+                )
+            self.quantization = self._quantized
+        with keys_path.open("rb") as f:
+            f.seek(self.keys_size)
+            keys = f.read(meta["keys_size"] - self.keys_size)
+        self.keys_size = meta["keys_size"]
+        self._extend([json.loads(line) for line in keys.splitlines()])
+        self._delete(sorted(set(meta["deleted"]) - self.deleted))
+        self._remap()
+        if not appended:
+            LOGGER.info(
+                "Embedded store with %d document(s) at %s",
+                self.count_documents(),
+                self.path,
+            )
+
+    def _read_meta(self) -> dict | None:
+        """Return the content of `meta.json`, `None` for a new store.
+
+        Between the two renames of `compact` swapping the directories, only
+        the old directory exists: wait for the new one rather than loading an
+        empty store.
+        """
+        old = self.path.with_name(self.path.name + ".old")
+        deadline = time.monotonic() + SWAP_TIMEOUT
+        while True:
+            try:
+                return json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                if not old.exists() or time.monotonic() > deadline:
+                    return None
+            time.sleep(0.01)
+
+    def _extend(self, keys: list[list[str]]):
+        """Add rows with the given ids and sources to the in-memory maps."""
+        for doc_id, source in keys:
+            self._rows[doc_id] = self.rows
+            self._by_source.setdefault(source, []).append(self.rows)
+            self.ids.append(doc_id)
+            self.sources.append(source)
+            self.rows += 1
+        self._alive = np.concatenate([self._alive, np.ones(len(keys), dtype=bool)])
+
+    def _delete(self, rows: list[int]):
+        """Mark rows as deleted in the in-memory maps."""
+        for row in rows:
+            self.deleted.add(row)
+            self._alive[row] = False
+            if self._rows.get(self.ids[row]) == row:
+                del self._rows[self.ids[row]]
+            self._by_source[self.sources[row]].remove(row)
+
+    def _remap(self):
+        """Map the committed rows of the data files."""
+        if not self.rows:
+            self._vectors = np.zeros((0, self.embedding_dim), dtype=self.dtype)
+            self._offsets = np.zeros(1, dtype=np.int64)
+            self._lists = np.zeros(0, dtype=np.int32)
+            self._codes = None
+            return
+        self._vectors = np.memmap(
+            self.path / "vectors.bin",
+            dtype=self.dtype,
+            mode="r",
+            shape=(self.rows, self.embedding_dim),
+        )
+        self._offsets = np.memmap(
+            self.path / "offsets.bin", dtype=np.int64, mode="r", shape=(self.rows + 1,)
+        )
+        self._lists = (
+            np.memmap(
+                self.path / "lists.bin", dtype=np.int32, mode="r", shape=(self.rows,)
+            )
+            if self._centroids is not None
+            else np.zeros(0, dtype=np.int32)
+        )
+        self._codes = (
+            np.memmap(
+                self.path / "codes.bin",
+                dtype=quantization.code_dtype(self._quantized),
+                mode="r",
+                shape=(
+                    self.rows,
+                    quantization.code_size(self._quantized, self.embedding_dim),
+                ),
+            )
+            if self._quantized is not None
+            else None
+        )
+        if self._fd is None:
+            self._fd = os.open(self.path / "documents.jsonl", os.O_RDONLY)
+
+    def refresh(self):
+        """Reload the store if another process changed it."""
+        meta_path = self.path / "meta.json"
+        mtime = meta_path.stat().st_mtime_ns if meta_path.exists() else None
+        if mtime != self._mtime:
+            with self._lock:
+                self._load()
+
+    def _commit(self):
+        """Write `meta.json` atomically, making the appended rows visible."""
+        tmp = self.path / "meta.json.tmp"
+        tmp.write_text(
+            json.dumps(
+                {
+                    "dim": self.embedding_dim,
+                    "dtype": self.dtype,
+                    "rows": self.rows,
+                    "keys_size": self.keys_size,
+                    "deleted": sorted(self.deleted),
+                    "ivf": (
+                        {"trained_rows": self._trained_rows}
+                        if self._centroids is not None
+                        else None
+                    ),
+                    "quantization": (
+                        {"kind": self._quantized, "scale": self._scale}
+                        if self._quantized is not None
+                        else None
+                    ),
+                }
+            ),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path / "meta.json")
+        self._mtime = (self.path / "meta.json").stat().st_mtime_ns
+        self._inode = (self.path / "keys.jsonl").stat().st_ino
+
+    def _read(self, rows: list[int]) -> list[Document]:
+        documents = []
+        for row in rows:
+            start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+            data = json.loads(os.pread(self._fd, end - start, start))
+            documents.append(
+                Document(id=data["id"], content=data["content"], meta=data["meta"])
+            )
+        return documents
+
+    def to_dict(self) -> dict[str, Any]:
+        """Serialize the store to a dictionary."""
+        return default_to_dict(
+            self,
+            path=str(self.path),
+            embedding_dim=self.embedding_dim,
+            dtype=self.dtype,
+            compact_ratio=self.compact_ratio,
+            ivf=self.ivf,
+            nlist=self.nlist,
+            nprobe=self.nprobe,
+            ivf_min_rows=self.ivf_min_rows,
+            quantization=self.quantization,
+            oversampling=self.oversampling,
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "EmbeddedDocumentStore":
+        """Deserialize the store from a dictionary."""
+        return default_from_dict(cls, data)
+
+    def count_documents(self) -> int:
+        """Return the number of documents in the store."""
+        self.refresh()
+        return self.rows - len(self.deleted)
+
+    def _filter_rows(self, filters: dict[str, Any] | None) -> list[int]:
+        """Return the live rows matching the filters, fast for `meta.source_path`."""
+        # Deleted rows are removed from `_by_source`, so its rows are all live
+        if filters and filters.get("field") == "meta.source_path":
+            if filters.get("operator") == "==":
+                return list(self._by_source.get(filters["value"], []))
+            if filters.get("operator") == "in":
+                return [r for s in filters["value"] for r in self._by_source.get(s, [])]
+        rows = sorted(self._rows.values())
+        if not filters:
+            return rows
+        return [
+            row
+            for row, doc in zip(rows, self._read(rows), strict=True)
+            if document_matches_filter(filters, doc)
+        ]
+
+    def filter_documents(self, filters: dict[str, Any] | None = None) -> list[Document]:
+        """Return the documents matching the filters, without their embeddings."""
+        self.refresh()
+        with self._lock:
+            return self._read(self._filter_rows(filters))
+
+    def get_documents_by_id(self, document_ids: list[str]) -> list[Document]:
+        """Return the documents with the given ids, skipping unknown ones."""
+        self.refresh()
+        with self._lock:
+            rows = [self._rows.get(i) for i in document_ids]
+            return self._read([r for r in rows if r is not None])
+
+    def write_documents(
+        self, documents: list[Document], policy: DuplicatePolicy = DuplicatePolicy.NONE
+    ) -> int:
+        """Append the documents, which must have embeddings, and commit them.
+
+        With `DuplicatePolicy.OVERWRITE` an existing document is deleted and
+        appended again, with `SKIP` it is kept, otherwise an error is raised.
+        """
+        for doc in documents:
+            if doc.embedding is None:
+                raise ValueError(f"Document {doc.id} has no embedding")
+        with self._lock:
+            self.refresh()
+            new: dict[str, Document] = {}
+            for doc in documents:
+                if doc.id in self._rows or doc.id in new:
+                    if policy == DuplicatePolicy.SKIP:
+                        continue
+                    if policy != DuplicatePolicy.OVERWRITE:
+                        raise DuplicateDocumentError(
+                            f"Document {doc.id} already exists"
+                        )
+                new[doc.id] = doc
+            if not new:
+                return 0
+            self._delete([self._rows[i] for i in new if i in self._rows])
+            self._append(list(new.values()))
+            self._commit()
+            self._maintain()
+            return len(new)
+
+    def _append(self, documents: list[Document], lists: np.ndarray | None = None):
+        """Append rows to the data files, past the committed ones only.
+
+        With IVF centroids, the list of each row is appended too, assigned
+        here unless given, and with quantization its code. The int8 scale is
+        calibrated on the first rows of the store.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        vectors = np.asarray([d.embedding for d in documents], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = (vectors / np.maximum(norms, 1e-12)).astype(self.dtype)
+        lines = [
+            json.dumps(
+                {"id": d.id, "content": d.content, "meta": d.meta},
+                ensure_ascii=False,
+                default=str,
+            ).encode()
+            + b"\n"
+            for d in documents
+        ]
+        keys = [[d.id, d.meta.get("source_path", "")] for d in documents]
+        keys_data = b"".join(json.dumps(k).encode() + b"\n" for k in keys)
+        start = int(self._offsets[self.rows])
+        offsets = start + np.cumsum([len(line) for line in lines], dtype=np.int64)
+        if not self.rows:
+            offsets = np.concatenate([np.zeros(1, dtype=np.int64), offsets])
+        itemsize = np.dtype(self.dtype).itemsize
+        files = [
+            ("vectors.bin", self.rows * self.embedding_dim * itemsize, vectors),
+            ("offsets.bin", (self.rows + 1) * 8 if self.rows else 0, offsets),
+            ("documents.jsonl", start, b"".join(lines)),
+            ("keys.jsonl", self.keys_size, keys_data),
+        ]
+        if self._centroids is not None:
+            if lists is None:
+                lists = ivf.assign(self._centroids, vectors)
+            files.append(("lists.bin", self.rows * 4, lists.astype(np.int32)))
+        if self.quantization is not None and not self.rows:
+            self._quantized = self.quantization
+            self._scale = quantization.calibrate(vectors)
+        if self._quantized is not None:
+            size = quantization.code_size(self._quantized, self.embedding_dim)
+            files.append(
+                (
+                    "codes.bin",
+                    self.rows * size,
+                    quantization.encode(self._quantized, vectors, self._scale),
+                )
+            )
+        # Bytes past the committed sizes are left over from an interrupted write
+        for name, size, data in files:
+            file = self.path / name
+            with file.open("r+b" if file.exists() else "wb") as f:
+                f.truncate(size)
+                f.seek(size)
+                f.write(data if isinstance(data, bytes) else data.tobytes())
+        self.keys_size += len(keys_data)
+        self._extend(keys)
+        self._remap()
+
+    def delete_documents(self, document_ids: list[str]):
+        """Delete the documents with the given ids."""
+        with self._lock:
+            self.refresh()
+            rows = [r for i in document_ids if (r := self._rows.get(i)) is not None]
+            if not rows:
+                return
+            self._delete(rows)
+            self._commit()
+            self._maintain()
+
+    def _maintain(self):
+        """Compact away the deleted rows, train the IVF lists or quantize if due."""
+        live = self.rows - len(self.deleted)
+        if (
+            (self.deleted and len(self.deleted) >= self.compact_ratio * self.rows)
+            or (
+                self.ivf
+                and live >= self.ivf_min_rows
+                and (self._trained_rows is None or live >= 4 * self._trained_rows)
+            )
+            or (self.quantization is not None and self._quantized is None)
+        ):
+            self.compact()
+
+    def compact(self):
+        """Rewrite the store without its deleted rows and swap it in.
+
+        With `ivf`, the lists are (re)trained on the kept rows, which are
+        written grouped by list. With `quantization`, the codes are rebuilt,
+        calibrated on a sample of the kept rows.
+        """
+        with self._lock:
+            self.refresh()
+            rows = np.array(sorted(self._rows.values()), dtype=np.int64)
+            LOGGER.info(
+                "Compacting %s, %d of %d row(s) kept", self.path, len(rows), self.rows
+            )
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            shutil.rmtree(tmp, ignore_errors=True)
+            compacted = EmbeddedDocumentStore(
+                tmp, self.embedding_dim, self.dtype, quantization=self.quantization
+            )
+            tmp.mkdir(parents=True)
+            # Opened on load, even if no row is kept
+            (tmp / "keys.jsonl").touch()
+            lists = None
+            if self.ivf and len(rows) >= self.ivf_min_rows:
+                nlist = self.nlist or ivf.default_nlist(len(rows))
+                centroids = ivf.train(self._vectors[ivf.sample(rows, nlist)], nlist)
+                lists = np.concatenate(
+                    [
+                        ivf.assign(centroids, self._vectors[block])
+                        for block in np.array_split(
+                            rows, range(BLOCK_ROWS, len(rows), BLOCK_ROWS)
+                        )
+                    ]
+                )
+                order = np.argsort(lists, kind="stable")
+                rows, lists = rows[order], lists[order]
+                np.save(tmp / "centroids.npy", centroids)
+                compacted._centroids = centroids
+                compacted._trained_rows = len(rows)
+            if self.quantization is not None and len(rows):
+                compacted._quantized = self.quantization
+                compacted._scale = quantization.calibrate(
+                    self._vectors[ivf.sample(rows, 64)]
+                )
+            for start in range(0, len(rows), BLOCK_ROWS):
+                block = rows[start : start + BLOCK_ROWS]
+                documents = self._read(block.tolist())
+                for doc, vector in zip(documents, self._vectors[block], strict=True):
+                    doc.embedding = vector.astype(np.float32)
+                compacted._append(
+                    documents,
+                    lists[start : start + BLOCK_ROWS] if lists is not None else None,
+                )
+            compacted._commit()
+            compacted.close()
+
+            old = self.path.with_name(self.path.name + ".old")
+            shutil.rmtree(old, ignore_errors=True)
+            if self.path.exists():
+                self.path.rename(old)
+            tmp.rename(self.path)
+            shutil.rmtree(old, ignore_errors=True)
+            self._load()
+
+    def close(self):
+        """Close the documents file."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray | None:
+        """Return the rows of the IVF lists to scan, `None` to scan all rows."""
+        if self._centroids is None or nprobe >= len(self._centroids):
+            return None
+        if self._inverted is None or self._inverted.stale(self.rows):
+            self._inverted = ivf.InvertedLists(
+                np.asarray(self._lists), len(self._centroids)
+            )
+        probed = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        return self._inverted.probe(self._lists, probed)
+
+    def _blocks(self, candidates: np.ndarray | None, matrix: np.ndarray):
+        """Yield the rows to score and their vectors or codes, block by block."""
+        if candidates is None:
+            for start in range(0, self.rows, BLOCK_ROWS):
+                end = min(start + BLOCK_ROWS, self.rows)
+                yield np.arange(start, end), matrix[start:end]
+            return
+        for start in range(0, len(candidates), BLOCK_ROWS):
+            rows = candidates[start : start + BLOCK_ROWS]
+            yield rows, matrix[rows]
+
+    def embedding_retrieval(
+        self,
+        query_embedding: list[float],
+        top_k: int = 10,
+        filters: dict[str, Any] | None = None,
+        nprobe: int | None = None,
+        exact: bool = False,
+    ) -> list[Document]:
+        """Return the `top_k` documents most similar to the query, by cosine.
+
+        The IVF lists and the codes are used unless `exact`, probing `nprobe`
+        lists (default: the store's `nprobe`).
+        """
+        self.refresh()
+        with self._lock:
+            query = np.asarray(query_embedding, dtype=np.float32)
+            query /= max(float(np.linalg.norm(query)), 1e-12)
+            allowed = None
+            if filters:
+                allowed = np.zeros(self.rows, dtype=bool)
+                allowed[self._filter_rows(filters)] = True
+            candidates = (
+                None if exact else self._candidates(query, nprobe or self.nprobe)
+            )
+            quantized = self._quantized if not exact else None
+            k = top_k
+            if quantized is not None:
+                k = max(top_k, int(np.ceil(top_k * self.oversampling)))
+                prepared = quantization.prepare(quantized, query, self._scale)
+            best_rows = np.zeros(0, dtype=np.int64)
+            best_scores = np.zeros(0, dtype=np.float32)
+            for rows, block in self._blocks(
+                candidates, self._vectors if quantized is None else self._codes
+            ):
+                scores = (
+                    np.asarray(block, dtype=np.float32) @ query
+                    if quantized is None
+                    else quantization.score(quantized, block, prepared)
+                )
+                mask = self._alive[rows]
+                if allowed is not None:
+                    mask = mask & allowed[rows]
+                scores[~mask] = -np.inf
+                top = np.argpartition(-scores, min(k, len(rows)) - 1)[:k]
+                best_rows = np.concatenate([best_rows, rows[top]])
+                best_scores = np.concatenate([best_scores, scores[top]])
+            keep = np.isfinite(best_scores)
+            best_rows, best_scores = best_rows[keep], best_scores[keep]
+            if quantized is not None:
+                # Rescore the best candidates with the full vectors
+                order = np.argsort(-best_scores, kind="stable")[:k]
+                best_rows = np.sort(best_rows[order])
+                best_scores = np.asarray(self._vectors[best_rows], np.float32) @ query
+            order = np.argsort(-best_scores, kind="stable")[:top_k]
+            documents = self._read(best_rows[order].tolist())
+        for doc, score in zip(documents, best_scores[order], strict=True):
+            doc.score = float(score)
+        return documents
+
+
+@component
+class EmbeddedEmbeddingRetriever:
+    """Retrieve the chunks most similar to a query embedding from an embedded store."""
+
+    def __init__(
+        self,
+        document_store: EmbeddedDocumentStore,
+        top_k: int = 10,
+        filters: dict[str, Any] | None = None,
+    ):
+        """Create the retriever."""
+        self.document_store = document_store
+        self.top_k = top_k
+        self.filters = filters
+
+    @component.output_types(documents=list[Document])
+    def run(
+        self,
+        query_embedding: list[float],
+        filters: dict[str, Any] | None = None,
+        top_k: int | None = None,
+    ) -> dict[str, Any]:
+        """Return the most similar chunks, best first."""
+        return {
+            "documents": self.document_store.embedding_retrieval(
+                query_embedding,
+                top_k=top_k or self.top_k,
+                filters=filters or self.filters,
+            )
+        }
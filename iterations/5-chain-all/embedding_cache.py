@@ -0,0 +1,203 @@
+"""Persistent embedding cache in front of the document embedder."""
+
+from collections import OrderedDict
+from dataclasses import replace
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+from typing import TYPE_CHECKING
+import unicodedata
+
+from haystack import Document, component
+import numpy as np
+
+if TYPE_CHECKING:
+    # Imports torch and the models, only needed once documents are embedded
+    from haystack.components.embedders import SentenceTransformersDocumentEmbedder
+
+LOGGER = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a chunk text so cosmetic whitespace changes still hit the cache."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """On-disk LRU cache of float32 embeddings.
+
+    Vectors live in a memory-mapped file with a fixed number of slots
+    (`max_entries`); the key to slot mapping is kept in memory in LRU order
+    and persisted as a JSON sidecar. Keys are the sha256 of the model name and
+    the normalized chunk text. The key of each slot is also stored next to its
+    vector, so a slot reused after the last `save` is not read for its old key.
+    """
+
+    def __init__(self, path: Path, model: str, dim: int, max_entries: int = 100_000):
+        """Open or create the cache stored at `path` (without suffix)."""
+        self.model = model
+        self.dim = dim
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Model names may contain dots, e.g. bge-small-en-v1.5
+        self._index_path = path.with_name(path.name + ".json")
+        self._vectors_path = path.with_name(path.name + ".f32")
+        self._keys_path = path.with_name(path.name + ".keys")
+        self._slots: OrderedDict[str, int] = OrderedDict()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if (
+            self._index_path.exists()
+            and self._vectors_path.exists()
+            and self._keys_path.exists()
+        ):
+            index = json.loads(self._index_path.read_text(encoding="utf-8"))
+            if (index["model"], index["dim"], index["max_entries"]) == (
+                model,
+                dim,
+                max_entries,
+            ):
+                self._slots = OrderedDict(index["entries"])
+            else:
+                LOGGER.warning("Embedding cache %s is incompatible, resetting", path)
+        # Slots not holding an entry, the lowest one last
+        used = set(self._slots.values())
+        self._free = [s for s in reversed(range(max_entries)) if s not in used]
+        mode = "r+" if self._slots else "w+"
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=np.float32, mode=mode, shape=(max_entries, dim)
+        )
+        # The sha256 digest of the key of each slot
+        self._keys = np.memmap(
+            self._keys_path, dtype=np.uint8, mode=mode, shape=(max_entries, 32)
+        )
+        LOGGER.info("Embedding cache with %d entries at %s", len(self), path)
+
+    def __len__(self) -> int:
+        """Return the number of cached vectors."""
+        return len(self._slots)
+
+    def key(self, text: str) -> str:
+        """Return the cache key of a chunk text."""
+        return hashlib.sha256(
+            f"{self.model}\0{normalize_text(text)}".encode()
+        ).hexdigest()
+
+    def get(self, text: str) -> list[float] | None:
+        """Return the cached vector of a text, or `None` on a miss."""
+        key = self.key(text)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is not None and bytes(self._keys[slot]) != bytes.fromhex(key):
+                # Reused for another key by a process which did not save
+                del self._slots[key]
+                self._free.append(slot)
+                slot = None
+            if slot is None:
+                self.misses += 1
+                return None
+            self._slots.move_to_end(key)
+            self.hits += 1
+            return self._vectors[slot].tolist()
+
+    def put(self, text: str, embedding: list[float]):
+        """Store the vector of a text, evicting the least recently used one if full."""
+        key = self.key(text)
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    _, slot = self._slots.popitem(last=False)
+                self._slots[key] = slot
+            self._slots.move_to_end(key)
+            # Invalidate the slot while its vector is replaced
+            self._keys[slot] = 0
+            self._vectors[slot] = embedding
+            self._keys[slot] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+
+    def stats(self) -> dict:
+        """Return the hit/miss counters."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def save(self):
+        """Flush the vectors and write the index atomically."""
+        with self._lock:
+            self._vectors.flush()
+            self._keys.flush()
+            tmp = self._index_path.with_name(self._index_path.name + ".tmp")
+            tmp.write_text(
+                json.dumps(
+                    {
+                        "model": self.model,
+                        "dim": self.dim,
+                        "max_entries": self.max_entries,
+                        "entries": list(self._slots.items()),
+                    }
+                ),
+                encoding="utf-8",
+            )
+            os.replace(tmp, self._index_path)
+
+
+@component
+class CachedDocumentEmbedder:
+    """Document embedder which only runs the model on cache misses.
+
+    The wrapped embedder is warmed up lazily, so a run served entirely from
+    the cache never loads the model.
+    """
+
+    def __init__(
+        self, embedder: "SentenceTransformersDocumentEmbedder", cache: EmbeddingCache
+    ):
+        """Wrap `embedder` with `cache`."""
+        self.embedder = embedder
+        self.cache = cache
+        self._warm = False
+
+    def warm_up(self):
+        """Defer loading the model until the first cache miss."""
+
+    @component.output_types(documents=list[Document])
+    def run(self, documents: list[Document]):
+        """Embed the documents, using cached vectors where possible."""
+        embedded: list[Document | None] = []
+        missing: list[int] = []
+        for i, doc in enumerate(documents):
+            embedding = self.cache.get(doc.content or "")
+            if embedding is None:
+                missing.append(i)
+                embedded.append(None)
+            else:
+                embedded.append(replace(doc, embedding=embedding))
+
+        if missing:
+            if not self._warm:
+                self.embedder.warm_up()
+                self._warm = True
+            result = self.embedder.run(documents=[documents[i] for i in missing])
+            for i, doc in zip(missing, result["documents"], strict=True):
+                self.cache.put(doc.content or "", doc.embedding)
+                embedded[i] = doc
+        self.cache.save()
+
+        LOGGER.info(
+            "Embedded %d document(s), %d from cache (%s)",
+            len(documents),
+            len(documents) - len(missing),
+            self.cache.stats(),
+        )
+        return {"documents": embedded}
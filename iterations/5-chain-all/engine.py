@@ -0,0 +1,179 @@
+"""Pipelined indexing engine overlapping conversion, splitting, embedding and writing."""
+
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+import logging
+from pathlib import Path
+import queue
+import threading
+import time
+from typing import Any
+
+from haystack import Document, tracing
+
+LOGGER = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class Batch:
+    """A micro-batch of sources travelling through the engine."""
+
+    sources: list[Path]
+    meta: list[dict]
+    documents: list[Document] = field(default_factory=list)
+    written: int = 0
+
+
+class PipelinedIndexer:
+    """Producer/consumer indexing engine.
+
+    Each stage runs in its own thread and hands batches to the next one through
+    a bounded queue, so a slow stage (usually the embedder) applies
+    backpressure instead of letting converted documents pile up in memory.
+    Conversion happens in the converter's process pool, the embedding model
+    and the store client release the GIL, so the stages overlap.
+    """
+
+    def __init__(
+        self,
+        router: Any,
+        converter: Any,
+        cleaner: Any,
+        splitter: Any,
+        embedder: Any,
+        writer: Any,
+        sparse_writer: Any | None = None,
+        queue_size: int = 2,
+        on_batch: Callable[[Batch], None] | None = None,
+    ):
+        """Create the engine from the indexing components.
+
+        `sparse_writer`, if given, gets the chunks right before `writer`.
+        """
+        self.router = router
+        self.converter = converter
+        self.cleaner = cleaner
+        self.splitter = splitter
+        self.embedder = embedder
+        self.writer = writer
+        self.sparse_writer = sparse_writer
+        self.queue_size = queue_size
+        self.on_batch = on_batch or (lambda batch: None)
+
+    def _convert(self, batch: Batch) -> Batch:
+        routed = self.router.run(sources=batch.sources, meta=batch.meta)
+        batch.documents = self.converter.run(
+            text_sources=routed.get("text/plain"),
+            pdf_sources=routed.get("application/pdf"),
+            markdown_sources=routed.get("text/markdown"),
+        )["documents"]
+        return batch
+
+    def _split(self, batch: Batch) -> Batch:
+        documents = self.cleaner.run(documents=batch.documents)["documents"]
+        batch.documents = self.splitter.run(documents=documents)["documents"]
+        return batch
+
+    def _embed(self, batch: Batch) -> Batch:
+        batch.documents = self.embedder.run(documents=batch.documents)["documents"]
+        return batch
+
+    def _write(self, batch: Batch) -> Batch:
+        if self.sparse_writer is not None:
+            self.sparse_writer.run(documents=batch.documents)
+        batch.written = self.writer.run(documents=batch.documents)["documents_written"]
+        batch.documents = []
+        self.on_batch(batch)
+        return batch
+
+    def _stage(
+        self,
+        name: str,
+        fn: Callable[[Batch], Batch],
+        inbox: queue.Queue,
+        outbox: queue.Queue,
+        errors: list[BaseException],
+    ):
+        while (batch := inbox.get()) is not _DONE:
+            if errors:
+                # Keep draining so upstream stages never block on a full queue
+                continue
+            try:
+                with tracing.tracer.trace(
+                    f"indexing.{name}",
+                    tags={"batch_size": len(batch.sources)},
+                ) as span:
+                    batch = fn(batch)
+                    span.set_tag("documents", len(batch.documents))
+                outbox.put(batch)
+            except BaseException as e:
+                LOGGER.exception("Stage %s failed", name)
+                errors.append(e)
+        outbox.put(_DONE)
+
+    def run(self, batches: Iterable[Batch], total: int | None = None) -> int:
+        """Index the batches and return the number of chunks written."""
+        for c in (self.converter, self.embedder, self.writer):
+            if hasattr(c, "warm_up"):
+                c.warm_up()
+
+        stages = [
+            ("convert", self._convert),
+            ("split", self._split),
+            ("embed", self._embed),
+            ("write", self._write),
+        ]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(stages) + 1)]
+        errors: list[BaseException] = []
+        threads = [
+            threading.Thread(
+                target=self._stage,
+                args=(name, fn, queues[i], queues[i + 1], errors),
+                name=f"indexing-{name}",
+                daemon=True,
+            )
+            for i, (name, fn) in enumerate(stages)
+        ]
+        for t in threads:
+            t.start()
+
+        def feed():
+            for batch in batches:
+                if errors:
+                    break
+                queues[0].put(batch)
+            queues[0].put(_DONE)
+
+        feeder = threading.Thread(target=feed, name="indexing-feed", daemon=True)
+        feeder.start()
+
+        files = 0
+        written = 0
+        started = time.perf_counter()
+        while (batch := queues[-1].get()) is not _DONE:
+            files += len(batch.sources)
+            written += batch.written
+            elapsed = time.perf_counter() - started
+            LOGGER.info(
+                "Indexed %d/%s file(s), %d chunk(s) written, %.1f chunks/s",
+                files,
+                total if total is not None else "?",
+                written,
+                written / elapsed if elapsed else 0.0,
+            )
+        feeder.join()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+
+        elapsed = time.perf_counter() - started
+        LOGGER.info(
+            "Pipelined indexing wrote %d chunk(s) in %.1fs (%.1f chunks/s)",
+            written,
+            elapsed,
+            written / elapsed if elapsed else 0.0,
+        )
+        return written
@@ -1,19 +1,26 @@
 """Indexing pipeline for recipe files using Haystack and Qdrant."""
+
+import argparse
 import logging
+import os
 from pathlib import Path
+import time
 
+from bm25 import BM25Index, BM25Writer
+import component_tracing
+from conversion import ParallelConverter
+from corpora import Corpus
+from embedding_cache import CachedDocumentEmbedder, EmbeddingCache
+from engine import Batch, PipelinedIndexer
 from haystack import Pipeline
-from haystack.components.converters import (
-    MarkdownToDocument,
-    PyPDFToDocument,
-    TextFileToDocument,
-)
-from haystack.components.embedders import SentenceTransformersDocumentEmbedder
 from haystack.components.joiners import DocumentJoiner
 from haystack.components.preprocessors import DocumentCleaner, DocumentSplitter
 from haystack.components.routers import FileTypeRouter
-from haystack.components.writers import DocumentWriter
-from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
+from haystack.document_stores.types import DocumentStore
+from manifest import FileManifest
+from stores import STORES, create_document_store
+from watcher import watch
+from writer import BulkDocumentWriter
 
 LOGGER = logging.getLogger(__name__)
 logging.basicConfig(
@@ -23,60 +30,453 @@ logging.basicConfig(
 
 DIR = Path(__file__).resolve().parent
 DATA = DIR.parent.parent / "data" / "recipe_files"
+CACHE = DIR / ".cache"
+CORPUS = Corpus()
+MANIFEST = CORPUS.manifest()
+BM25 = CORPUS.bm25()
+EMBEDDED_STORE = CORPUS.embedded_store
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_CACHE_SIZE = 100_000
 
-document_store = QdrantDocumentStore(
-    url="http://localhost:6333",
-    index="5-chain-all",
-    embedding_dim=384,
-    similarity="cosine",  # or "dot" or "euclidean"
-)
-file_type_router = FileTypeRouter(
-    mime_types=["text/plain", "application/pdf", "text/markdown"]
-)
-text_file_converter = TextFileToDocument()
-markdown_converter = MarkdownToDocument()
-pdf_converter = PyPDFToDocument()
-document_joiner = DocumentJoiner()
-
-document_cleaner = DocumentCleaner()
-document_splitter = DocumentSplitter(
-    split_by="word", split_length=150, split_overlap=50
-)
 
-document_embedder = SentenceTransformersDocumentEmbedder(
-    model="sentence-transformers/all-MiniLM-L6-v2"
-)
-document_writer = DocumentWriter(document_store)
+def delete_file_chunks(
+    store: DocumentStore, keys: list[str], batch_size: int = 32
+) -> int:
+    """Delete all chunks originating from the given files from the store."""
+    deleted = 0
+    for start in range(0, len(keys), batch_size):
+        documents = store.filter_documents(
+            {
+                "field": "meta.source_path",
+                "operator": "in",
+                "value": keys[start : start + batch_size],
+            }
+        )
+        store.delete_documents([d.id for d in documents])
+        deleted += len(documents)
+    return deleted
+
+
+def source_meta(manifest: FileManifest, sources: list[Path]) -> list[dict]:
+    """Return the meta attached to each source, used to find its chunks again."""
+    return [{"source_path": manifest.key(source)} for source in sources]
+
+
+class Indexer:
+    """Indexing pipeline of a corpus into a document store and its BM25 index.
+
+    Built on demand rather than at import, so that the conversion processes,
+    which import this module again, do not open the stores and caches.
+    """
+
+    def __init__(
+        self,
+        document_store: DocumentStore,
+        bm25_index: BM25Index,
+        embedding_cache: EmbeddingCache,
+        embedding_model: str = EMBEDDING_MODEL,
+        workers: int | None = None,
+        write_batch_size: int = 256,
+        write_concurrency: int = 4,
+    ):
+        """Create the components writing to `document_store` and `bm25_index`."""
+        from haystack.components.embedders import SentenceTransformersDocumentEmbedder
+
+        self.document_store = document_store
+        self.bm25_index = bm25_index
+        self.embedding_cache = embedding_cache
+        self.file_type_router = FileTypeRouter(
+            mime_types=["text/plain", "application/pdf", "text/markdown"]
+        )
+        self.converter = ParallelConverter(workers)
+        self.document_cleaner = DocumentCleaner()
+        self.document_splitter = DocumentSplitter(
+            split_by="word", split_length=150, split_overlap=50
+        )
+        self.document_embedder = CachedDocumentEmbedder(
+            SentenceTransformersDocumentEmbedder(model=embedding_model),
+            embedding_cache,
+        )
+        self.bm25_writer = BM25Writer(bm25_index)
+        self.document_writer = BulkDocumentWriter(
+            document_store,
+            batch_size=write_batch_size,
+            max_in_flight=write_concurrency,
+        )
+
+        pipeline = Pipeline()
+        pipeline.add_component(instance=self.file_type_router, name="file_type_router")
+        pipeline.add_component(instance=self.converter, name="converter")
+        pipeline.add_component(instance=DocumentJoiner(), name="document_joiner")
+        pipeline.add_component(instance=self.document_cleaner, name="document_cleaner")
+        pipeline.add_component(
+            instance=self.document_splitter, name="document_splitter"
+        )
+        pipeline.add_component(
+            instance=self.document_embedder, name="document_embedder"
+        )
+        pipeline.add_component(instance=self.bm25_writer, name="bm25_writer")
+        pipeline.add_component(instance=self.document_writer, name="document_writer")
+
+        pipeline.connect("file_type_router.text/plain", "converter.text_sources")
+        pipeline.connect("file_type_router.application/pdf", "converter.pdf_sources")
+        pipeline.connect("file_type_router.text/markdown", "converter.markdown_sources")
+        pipeline.connect("converter", "document_joiner")
+        pipeline.connect("document_joiner", "document_cleaner")
+        pipeline.connect("document_cleaner", "document_splitter")
+        pipeline.connect("document_splitter", "document_embedder")
+        pipeline.connect("document_embedder", "bm25_writer")
+        pipeline.connect("bm25_writer", "document_writer")
+        self.pipeline = pipeline
+
+    def mark_indexed(self, manifest: FileManifest, records: dict, sources: list[Path]):
+        """Record the sources as indexed once their chunks are written.
+
+        Their chunks are saved to the BM25 index first, so that the manifest
+        never lists files missing from it, even if indexing is interrupted.
+        """
+        self.bm25_index.save()
+        for source in sources:
+            key = manifest.key(source)
+            manifest.records[key] = records[key]
+        manifest.save()
+
+    def run_pipelined(
+        self,
+        manifest: FileManifest,
+        records: dict,
+        sources: list[Path],
+        batch_size: int,
+        queue_size: int,
+    ) -> int:
+        """Index the sources with the overlapping producer/consumer engine."""
+        engine = PipelinedIndexer(
+            router=self.file_type_router,
+            converter=self.converter,
+            cleaner=self.document_cleaner,
+            splitter=self.document_splitter,
+            embedder=self.document_embedder,
+            writer=self.document_writer,
+            sparse_writer=self.bm25_writer,
+            queue_size=queue_size,
+            on_batch=lambda batch: self.mark_indexed(manifest, records, batch.sources),
+        )
+        batches = (
+            Batch(
+                sources=sources[start : start + batch_size],
+                meta=source_meta(manifest, sources[start : start + batch_size]),
+            )
+            for start in range(0, len(sources), batch_size)
+        )
+        return engine.run(batches, total=len(sources))
+
+    def run_streaming(
+        self,
+        manifest: FileManifest,
+        records: dict,
+        sources: list[Path],
+        batch_size: int,
+    ) -> int:
+        """Run the pipeline over the sources in micro-batches of `batch_size` files.
+
+        Only one batch of files, documents and chunks is held in memory at a
+        time. The manifest and the BM25 index are saved after each batch, so
+        an interrupted run resumes where it stopped. Returns the number of
+        chunks written.
+        """
+        written = 0
+        started = time.perf_counter()
+        for start in range(0, len(sources), batch_size):
+            batch = sources[start : start + batch_size]
+            result = self.pipeline.run(
+                {
+                    "file_type_router": {
+                        "sources": batch,
+                        "meta": source_meta(manifest, batch),
+                    }
+                }
+            )
+            written += result.get("document_writer", {}).get("documents_written", 0)
+            self.mark_indexed(manifest, records, batch)
+
+            done = start + len(batch)
+            elapsed = time.perf_counter() - started
+            LOGGER.info(
+                "Indexed %d/%d file(s), %d chunk(s) written, %.1fs elapsed, ~%.1fs left",
+                done,
+                len(sources),
+                written,
+                elapsed,
+                elapsed / done * (len(sources) - done),
+            )
+        return written
+
+    def index(
+        self,
+        data: Path,
+        manifest_path: Path,
+        full: bool = False,
+        batch_size: int = 32,
+        pipelined: bool = False,
+        queue_size: int = 2,
+        paths: list[Path] | None = None,
+    ) -> int:
+        """Index the new and changed files of `data`, return the chunks written.
+
+        With `paths`, only these files and the files under these directories are
+        compared with the manifest, e.g. the ones a watcher saw change.
+        """
+        LOGGER.info("Fetching data from %s", str(data))
+        manifest = FileManifest(manifest_path, root=data)
+        if manifest.records and not full:
+            if not len(self.bm25_index):
+                LOGGER.info(
+                    "The BM25 index is empty, re-indexing every file to build it"
+                )
+                full = True
+            elif not self.document_store.count_documents():
+                LOGGER.info("The document store is empty, re-indexing every file")
+                full = True
+        stale = []
+        if full:
+            stale = list(manifest.records)
+            manifest.records.clear()
+        if paths is not None and not full:
+            within = [manifest.key(p) for p in paths]
+            files = {f for p in paths for f in ([p] if p.is_file() else p.glob("**/*"))}
+        else:
+            within = None
+            files = data.glob("**/*")
+        diff = manifest.diff(sorted(p for p in files if p.is_file()), within)
+        LOGGER.info(
+            "%d added, %d changed, %d removed, %d unchanged file(s)",
+            len(diff.added),
+            len(diff.changed),
+            len(diff.removed),
+            diff.unchanged,
+        )
+
+        outdated = stale + diff.removed + [manifest.key(p) for p in diff.changed]
+        deleted = delete_file_chunks(self.document_store, outdated)
+        self.bm25_index.remove(outdated)
+        self.bm25_index.save()
+        LOGGER.info("%d stale chunk(s) deleted from the store", deleted)
+        for key in diff.removed:
+            manifest.records.pop(key, None)
+        # The mtime of the manifest versions the query cache of the tool server,
+        # so it is only written when something changed
+        if outdated:
+            manifest.save()
+
+        try:
+            if pipelined:
+                written = self.run_pipelined(
+                    manifest,
+                    diff.records,
+                    diff.to_index,
+                    batch_size,
+                    queue_size,
+                )
+            else:
+                written = self.run_streaming(
+                    manifest,
+                    diff.records,
+                    diff.to_index,
+                    batch_size,
+                )
+        finally:
+            self.converter.close()
+            self.document_writer.close()
+        # Files whose content did not change but whose mtime did
+        if diff.records:
+            manifest.apply(diff)
+            manifest.save()
+
+        LOGGER.info("Embedding cache: %s", self.embedding_cache.stats())
+        LOGGER.info("%d chunk(s) in the BM25 index", len(self.bm25_index))
+
+        LOGGER.info(
+            "%d document(s) written to the store", self.document_store.count_documents()
+        )
+        return written
 
-indexing_pipeline = Pipeline()
-indexing_pipeline.add_component(instance=file_type_router, name="file_type_router")
-indexing_pipeline.add_component(
-    instance=text_file_converter, name="text_file_converter"
-)
-indexing_pipeline.add_component(instance=markdown_converter, name="markdown_converter")
-indexing_pipeline.add_component(instance=pdf_converter, name="pypdf_converter")
-indexing_pipeline.add_component(instance=document_joiner, name="document_joiner")
-indexing_pipeline.add_component(instance=document_cleaner, name="document_cleaner")
-indexing_pipeline.add_component(instance=document_splitter, name="document_splitter")
-indexing_pipeline.add_component(instance=document_embedder, name="document_embedder")
-indexing_pipeline.add_component(instance=document_writer, name="document_writer")
-
-indexing_pipeline.connect("file_type_router.text/plain", "text_file_converter.sources")
-indexing_pipeline.connect("file_type_router.application/pdf", "pypdf_converter.sources")
-indexing_pipeline.connect(
-    "file_type_router.text/markdown", "markdown_converter.sources"
-)
-indexing_pipeline.connect("text_file_converter", "document_joiner")
-indexing_pipeline.connect("pypdf_converter", "document_joiner")
-indexing_pipeline.connect("markdown_converter", "document_joiner")
-indexing_pipeline.connect("document_joiner", "document_cleaner")
-indexing_pipeline.connect("document_cleaner", "document_splitter")
-indexing_pipeline.connect("document_splitter", "document_embedder")
-indexing_pipeline.connect("document_embedder", "document_writer")
 
-indexing_pipeline.draw(str(DIR / "indexing.png"))
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index the recipe files")
+    parser.add_argument(
+        "--corpus",
+        type=Corpus,
+        default=CORPUS,
+        help=f"Corpus indexed, in its own collection (default: {CORPUS.name})",
+    )
+    parser.add_argument(
+        "--data",
+        type=Path,
+        default=None,
+        help="Directory of the files of the corpus (default: the recipe files)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and index the files as they change, converted in process",
+    )
+    parser.add_argument(
+        "--quiet",
+        type=float,
+        default=1.0,
+        help="Seconds without file events before indexing a burst (default: 1)",
+    )
+    parser.add_argument(
+        "--max-delay",
+        type=float,
+        default=10.0,
+        help="Seconds after a first event a burst is indexed at the latest "
+        "(default: 10)",
+    )
+    parser.add_argument(
+        "--polling",
+        action="store_true",
+        help="Poll the files instead of using inotify, e.g. on network shares",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=2.0,
+        help="Seconds between two polls of the files (default: 2)",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the manifest and re-index every file",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="Number of files pushed through the pipeline at once (default: 32)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of file conversion processes (default: cpu count)",
+    )
+    parser.add_argument(
+        "--write-batch-size",
+        type=int,
+        default=256,
+        help="Number of chunks per upsert request (default: 256)",
+    )
+    parser.add_argument(
+        "--write-concurrency",
+        type=int,
+        default=4,
+        help="Number of upsert requests in flight (default: 4)",
+    )
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="Overlap conversion, splitting, embedding and writing in threads",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=2,
+        help="Batches buffered between pipelined stages (default: 2)",
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        default=None,
+        help="Append per-component timing spans to this JSON lines file",
+    )
+    parser.add_argument(
+        "--otel",
+        action="store_true",
+        help="Send the spans to the OpenTelemetry tracer configured by OTEL_* variables",
+    )
+    parser.add_argument(
+        "--store",
+        default="qdrant",
+        choices=STORES,
+        help="Document store, the Qdrant service or local files (default: qdrant)",
+    )
+    parser.add_argument(
+        "--store-dtype",
+        default="float32",
+        choices=["float32", "float16"],
+        help="Vector precision of a new embedded store (default: float32)",
+    )
+    parser.add_argument(
+        "--ivf",
+        action="store_true",
+        help="Build IVF lists in the embedded store for approximate search",
+    )
+    parser.add_argument(
+        "--quantization",
+        default=None,
+        choices=["int8", "binary"],
+        help="Quantized codes searched instead of the vectors, in a new store",
+    )
+    args = parser.parse_args()
+    if args.trace or args.otel:
+        component_tracing.enable(args.trace, args.otel)
+    if args.data is None:
+        if args.corpus != CORPUS:
+            parser.error("--data is required to index another corpus")
+        args.data = DATA
+    document_store = create_document_store(
+        args.store,
+        url="http://localhost:6333",
+        prefer_grpc=True,  # upserts go over gRPC on port 6334
+        index=args.corpus.index,
+        path=args.corpus.embedded_store,
+        dtype=args.store_dtype,
+        ivf=args.ivf,
+        quantization=args.quantization,
+    )
+    indexer = Indexer(
+        document_store,
+        # Each store tracks the files it holds, and has the BM25 index of its chunks
+        BM25Index(args.corpus.bm25(args.store)),
+        EmbeddingCache(
+            CACHE / "embeddings" / EMBEDDING_MODEL.replace("/", "--"),
+            model=EMBEDDING_MODEL,
+            dim=384,
+            max_entries=EMBEDDING_CACHE_SIZE,
+        ),
+        workers=args.workers,
+        write_batch_size=args.write_batch_size,
+        write_concurrency=args.write_concurrency,
+    )
+    manifest_path = args.corpus.manifest(args.store)
 
-LOGGER.info("Fetching data from %s", str(DATA))
-indexing_pipeline.run({"file_type_router": {"sources": list(DATA.glob("**/*"))}})
+    indexer.pipeline.draw(str(DIR / "indexing.png"))
 
-LOGGER.info("%d document(s) written to the store", document_store.count_documents())
+    # Catches up with the changes made while not watching
+    indexer.index(
+        args.data,
+        manifest_path,
+        full=args.full,
+        batch_size=args.batch_size,
+        pipelined=args.pipelined,
+        queue_size=args.queue_size,
+    )
+    if args.watch:
+        # A pool of conversion processes would be started for every burst
+        indexer.converter.workers = 1
+        watch(
+            args.data,
+            lambda paths: indexer.index(
+                args.data,
+                manifest_path,
+                batch_size=args.batch_size,
+                pipelined=args.pipelined,
+                queue_size=args.queue_size,
+                paths=paths,
+            ),
+            quiet=args.quiet,
+            max_delay=args.max_delay,
+            polling=args.polling,
+            interval=args.poll_interval,
+        )
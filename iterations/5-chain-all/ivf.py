@@ -0,0 +1,89 @@
+"""Inverted file (IVF) index over unit vectors, for approximate search.
+
+The vectors are clustered by spherical k-means. A query only scores the
+vectors of the `nprobe` lists whose centroids are the most similar to it.
+"""
+
+import logging
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+# Vectors assigned at once, bounds the temporary score matrix
+BLOCK_ROWS = 8192
+
+
+def default_nlist(rows: int) -> int:
+    """Return the number of lists for `rows` vectors, about their square root."""
+    return max(1, int(round(np.sqrt(rows))))
+
+
+def assign(centroids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """Return the list of each vector, the one of its most similar centroid."""
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), BLOCK_ROWS):
+        block = np.asarray(vectors[start : start + BLOCK_ROWS], dtype=np.float32)
+        lists[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return lists
+
+
+def sample(rows: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Return the sorted rows to train `nlist` lists on, at most 64 per list."""
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.choice(rows, min(len(rows), 64 * nlist), replace=False))
+
+
+def train(
+    vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0
+) -> np.ndarray:
+    """Return `nlist` unit centroids clustering the unit `vectors`, see `sample`.
+
+    Spherical k-means; empty lists are restarted from random vectors.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    nlist = min(nlist, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        lists = assign(centroids, vectors)
+        order = np.argsort(lists, kind="stable")
+        counts = np.bincount(lists, minlength=nlist)
+        starts = np.cumsum(counts) - counts
+        empty = counts == 0
+        sums = np.empty_like(centroids)
+        sums[~empty] = np.add.reduceat(vectors[order], starts[~empty])
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = sums / np.maximum(
+            np.linalg.norm(sums, axis=1, keepdims=True), 1e-12
+        )
+    LOGGER.info("Trained %d IVF list(s) on %d vector(s)", nlist, len(vectors))
+    return centroids.astype(np.float32)
+
+
+class InvertedLists:
+    """Rows of each list, built from the list of each row.
+
+    Rows appended after the build are probed by a scan of their lists, until
+    they are numerous enough for `stale` to ask for a rebuild.
+    """
+
+    def __init__(self, lists: np.ndarray, nlist: int):
+        """Group the rows by list."""
+        self.rows = len(lists)
+        self.order = np.argsort(lists, kind="stable").astype(np.int32)
+        self.offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lists, minlength=nlist), out=self.offsets[1:])
+
+    def stale(self, rows: int) -> bool:
+        """Return whether many rows were appended since the build."""
+        return rows - self.rows > max(BLOCK_ROWS, self.rows // 10)
+
+    def probe(self, lists: np.ndarray, probed: np.ndarray) -> np.ndarray:
+        """Return the sorted rows of the `probed` lists, `lists` giving each row's."""
+        parts = [self.order[self.offsets[i] : self.offsets[i + 1]] for i in probed]
+        appended = np.asarray(lists[self.rows :])
+        parts.append(
+            self.rows + np.flatnonzero(np.isin(appended, probed)).astype(np.int32)
+        )
+        return np.sort(np.concatenate(parts))
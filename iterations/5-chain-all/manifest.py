@@ -0,0 +1,135 @@
+"""Persistent manifest of indexed files, used for incremental indexing."""
+
+from dataclasses import asdict, dataclass, field
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+LOGGER = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_hash(path: Path) -> str:
+    """Return the sha256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class FileRecord:
+    """State of a single indexed file."""
+
+    size: int
+    mtime: float
+    sha256: str
+
+
+@dataclass
+class ManifestDiff:
+    """Difference between the manifest and the files currently on disk."""
+
+    added: list[Path] = field(default_factory=list)
+    changed: list[Path] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    unchanged: int = 0
+    records: dict[str, FileRecord] = field(default_factory=dict)
+
+    @property
+    def to_index(self) -> list[Path]:
+        """Files which need to be converted and embedded."""
+        return self.added + self.changed
+
+    def __bool__(self) -> bool:
+        """Return whether anything changed."""
+        return bool(self.added or self.changed or self.removed)
+
+
+class FileManifest:
+    """Manifest of file path, size, mtime and content hash, stored as JSON.
+
+    Keys are paths relative to the data root, so the manifest stays valid when
+    the data folder is mounted elsewhere.
+    """
+
+    def __init__(self, path: Path, root: Path):
+        """Load the manifest from `path` if it exists."""
+        self.path = path
+        self.root = root
+        self.records: dict[str, FileRecord] = {}
+        if path.exists():
+            data = json.loads(path.read_text(encoding="utf-8"))
+            self.records = {k: FileRecord(**v) for k, v in data["files"].items()}
+            LOGGER.info("Loaded manifest with %d file(s) from %s", len(self), path)
+
+    def __len__(self) -> int:
+        """Return the number of files in the manifest."""
+        return len(self.records)
+
+    def key(self, path: Path) -> str:
+        """Return the manifest key of a file."""
+        return path.resolve().relative_to(self.root.resolve()).as_posix()
+
+    def diff(self, files: list[Path], within: list[str] | None = None) -> ManifestDiff:
+        """Compare the files on disk with the manifest.
+
+        Files whose size and mtime did not change are considered unchanged
+        without hashing them. Otherwise, the content hash decides. With
+        `within`, `files` are only those at or under these keys, and only
+        files there may be reported removed.
+        """
+        diff = ManifestDiff()
+        seen = set()
+        for path in files:
+            key = self.key(path)
+            seen.add(key)
+            stat = path.stat()
+            known = self.records.get(key)
+            if (
+                known is not None
+                and known.size == stat.st_size
+                and known.mtime == stat.st_mtime
+            ):
+                diff.unchanged += 1
+                continue
+            record = FileRecord(
+                size=stat.st_size, mtime=stat.st_mtime, sha256=file_hash(path)
+            )
+            diff.records[key] = record
+            if known is None:
+                diff.added.append(path)
+            elif known.sha256 != record.sha256:
+                diff.changed.append(path)
+            else:
+                diff.unchanged += 1
+        diff.removed = sorted(
+            key
+            for key in set(self.records) - seen
+            if within is None
+            or any(key == w or key.startswith(f"{w}/") or w == "." for w in within)
+        )
+        return diff
+
+    def apply(self, diff: ManifestDiff):
+        """Apply a diff to the manifest, after the store has been updated."""
+        for key in diff.removed:
+            self.records.pop(key, None)
+        self.records.update(diff.records)
+
+    def save(self):
+        """Write the manifest atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps(
+                {"files": {k: asdict(r) for k, r in sorted(self.records.items())}},
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
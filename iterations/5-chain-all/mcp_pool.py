@@ -0,0 +1,161 @@
+"""Pooled, long-lived MCP sessions with a cached tool list."""
+
+import asyncio
+from contextlib import AsyncExitStack
+import itertools
+import logging
+import threading
+from typing import Any
+
+from haystack.tools import Tool, Toolset
+from mcp import ClientSession, types
+from mcp.client.streamable_http import streamablehttp_client
+
+LOGGER = logging.getLogger(__name__)
+
+
+class MCPSessionPool:
+    """A few persistent streamable-http sessions to one MCP server.
+
+    All sessions live on a single background event loop, opened and closed by
+    the same task. Concurrent tool calls are spread over the sessions
+    round-robin, each session multiplexing its requests. The tool list is
+    fetched once and only refreshed after the server sends a
+    `tools/list_changed` notification.
+    """
+
+    def __init__(self, url: str, size: int = 4, timeout: float = 30.0):
+        """Connect `size` sessions to the server at `url`."""
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        self.tools_version = 0
+        self._tools: list[types.Tool] | None = None
+        self._sessions: list[ClientSession] = []
+        self._next = itertools.count()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="mcp-pool", daemon=True
+        )
+        self._thread.start()
+        self._ready = threading.Event()
+        self._closed: asyncio.Event | None = None
+        self._serving = asyncio.run_coroutine_threadsafe(self._serve(), self._loop)
+        # Wakes up the wait below as soon as connecting failed, too
+        self._serving.add_done_callback(lambda _: self._ready.set())
+        if not self._ready.wait(timeout):
+            self._serving.cancel()
+            raise TimeoutError(f"Could not connect to {url} within {timeout}s")
+        if self._serving.done():
+            self._serving.result()  # Raises the connection error
+        LOGGER.info("Connected %d MCP session(s) to %s", size, url)
+
+    async def _serve(self):
+        self._closed = asyncio.Event()
+        async with AsyncExitStack() as stack:
+            for _ in range(self.size):
+                read, write, _ = await stack.enter_async_context(
+                    streamablehttp_client(self.url, timeout=self.timeout)
+                )
+                session = await stack.enter_async_context(
+                    ClientSession(read, write, message_handler=self._on_message)
+                )
+                await session.initialize()
+                self._sessions.append(session)
+            self._ready.set()
+            await self._closed.wait()
+
+    async def _on_message(self, message: Any):
+        if isinstance(message, types.ServerNotification) and isinstance(
+            message.root, types.ToolListChangedNotification
+        ):
+            LOGGER.info("Tool list changed on %s", self.url)
+            self._tools = None
+
+    def _run(self, coro: Any, timeout: float | None = None) -> Any:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(
+            timeout or self.timeout
+        )
+
+    def _session(self) -> ClientSession:
+        return self._sessions[next(self._next) % len(self._sessions)]
+
+    async def _list_tools(self) -> list[types.Tool]:
+        if self._tools is None:
+            self._tools = (await self._session().list_tools()).tools
+            self.tools_version += 1
+        return self._tools
+
+    def list_tools(self) -> list[types.Tool]:
+        """Return the tools of the server, from the cache if still valid."""
+        tools = self._tools
+        return tools if tools is not None else self._run(self._list_tools())
+
+    def call_tool(
+        self, name: str, arguments: dict, timeout: float | None = None
+    ) -> str:
+        """Call a tool and return its text result."""
+        result = self._run(self._session().call_tool(name, arguments), timeout)
+        text = "\n".join(
+            c.text for c in result.content if isinstance(c, types.TextContent)
+        )
+        if result.isError:
+            raise RuntimeError(f"Tool {name} failed: {text}")
+        return text
+
+    def close(self):
+        """Close the sessions and stop the event loop."""
+        if self._closed is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._closed.set)
+            self._serving.result(self.timeout)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(self.timeout)
+            self._loop.close()
+
+
+class PooledMCPToolset(Toolset):
+    """Haystack toolset backed by an `MCPSessionPool`.
+
+    The tools are rebuilt from the pool's cached list whenever it changed, so
+    the LLM always gets the current schemas without a request per turn.
+    """
+
+    def __init__(self, pool: MCPSessionPool):
+        """Create the toolset from the tools of the pool."""
+        self.pool = pool
+        self._version = -1
+        super().__init__(tools=self._build())
+
+    def _build(self) -> list[Tool]:
+        tools = self.pool.list_tools()
+        self._version = self.pool.tools_version
+        return [
+            Tool(
+                name=tool.name,
+                description=tool.description or "",
+                parameters=tool.inputSchema,
+                function=lambda _name=tool.name, **kwargs: self.pool.call_tool(
+                    _name, kwargs
+                ),
+            )
+            for tool in tools
+        ]
+
+    def __iter__(self):
+        """Iterate over the tools, refreshing them if the server's list changed."""
+        self.pool.list_tools()
+        if self.pool.tools_version != self._version:
+            self.tools[:] = self._build()
+        return super().__iter__()
+
+    def to_dict(self) -> dict:
+        """Serialize the connection settings, not the tools."""
+        return {
+            "type": f"{type(self).__module__}.{type(self).__qualname__}",
+            "data": {"url": self.pool.url, "size": self.pool.size},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PooledMCPToolset":
+        """Connect a new pool from serialized settings."""
+        return cls(MCPSessionPool(**data["data"]))
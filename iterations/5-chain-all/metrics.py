@@ -0,0 +1,221 @@
+"""Minimal Prometheus metrics, rendered in the text exposition format."""
+
+from collections.abc import Callable, Iterator
+import contextlib
+import math
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], **extra: str) -> str:
+    pairs = [*zip(names, values, strict=True), *extra.items()]
+    if not pairs:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        function: Callable[[], float | None] | None = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.function = function
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], float] = {}
+        if not labels:
+            self._values[()] = 0.0
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def samples(self) -> Iterator[str]:
+        """Yield one line per label values, or the value of `function`."""
+        if self.function is not None:
+            value = self.function()
+            if value is not None:
+                yield f"{self.name} {_number(value)}"
+            return
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+
+    def render(self) -> str:
+        """Return the metric with its help and type lines."""
+        return "\n".join(
+            [
+                f"# HELP {self.name} {self.documentation}",
+                f"# TYPE {self.name} {self.type}",
+                *self.samples(),
+            ]
+        )
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, per label values.
+
+    With `function`, the count is read from it at each scrape instead.
+    """
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels: str):
+        """Increase the count of the given label values."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Value going up and down, or read from `function` at each scrape."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels: str):
+        """Set the value of the given label values."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        """Increase the value of the given label values."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        """Decrease the value of the given label values."""
+        self.inc(-amount, **labels)
+
+    @contextlib.contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        """Count the block as in progress while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        """Create the histogram with upper bounds `buckets`."""
+        super().__init__(name, documentation, labels)
+        self.buckets = (*sorted(buckets), math.inf)
+        # Per label values: the count of each bucket and the sum
+        self._buckets: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        """Record a value for the given label values."""
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._buckets.setdefault(
+                key, ([0] * len(self.buckets), [0.0])
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            total[0] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of the block in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Iterator[str]:
+        """Yield the bucket, sum and count lines per label values."""
+        with self._lock:
+            values = [(k, list(c), t[0]) for k, (c, t) in self._buckets.items()]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts, strict=True):
+                cumulative += count
+                labels = _labels(self.label_names, key, le=_number(bound))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_number(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """Set of metrics rendered together."""
+
+    def __init__(self):
+        """Create an empty registry."""
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add a metric, replacing one with the same name."""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text format."""
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(
+    name: str,
+    documentation: str,
+    labels: tuple[str, ...] = (),
+    function: Callable[[], float | None] | None = None,
+) -> Counter:
+    """Create and register a counter."""
+    return REGISTRY.register(Counter(name, documentation, labels, function))
+
+
+def gauge(
+    name: str,
+    documentation: str,
+    labels: tuple[str, ...] = (),
+    function: Callable[[], float | None] | None = None,
+) -> Gauge:
+    """Create and register a gauge."""
+    return REGISTRY.register(Gauge(name, documentation, labels, function))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labels: tuple[str, ...] = (),
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+) -> Histogram:
+    """Create and register a histogram."""
+    return REGISTRY.register(Histogram(name, documentation, labels, buckets))
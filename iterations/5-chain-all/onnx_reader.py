@@ -0,0 +1,124 @@
+"""Int8 quantized ONNX Runtime backend for the extractive reader, on CPU."""
+
+import logging
+import os
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+from batching import BatchExtractiveReader
+from haystack import component
+from haystack.utils import ComponentDevice
+
+LOGGER = logging.getLogger(__name__)
+
+DIR = Path(__file__).resolve().parent
+ONNX_CACHE = DIR / ".cache" / "onnx"
+
+
+def export_quantized(model: str, path: Path) -> Path:
+    """Export a question answering model to ONNX and quantize its weights to int8.
+
+    Returns the path of the quantized model, `path` itself if it already exists.
+    """
+    if path.exists():
+        return path
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    import torch
+    from transformers import AutoModelForQuestionAnswering
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    exported = path.with_name(path.stem + "-fp32.onnx")
+    LOGGER.info("Exporting %s to %s", model, exported)
+    qa_model = AutoModelForQuestionAnswering.from_pretrained(model).eval()
+    dummy = torch.ones((1, 8), dtype=torch.int64)
+    axes = {0: "batch", 1: "sequence"}
+    torch.onnx.export(
+        qa_model,
+        (dummy, dummy),
+        str(exported),
+        input_names=["input_ids", "attention_mask"],
+        output_names=["start_logits", "end_logits"],
+        dynamic_axes={
+            "input_ids": axes,
+            "attention_mask": axes,
+            "start_logits": axes,
+            "end_logits": axes,
+        },
+        opset_version=17,
+        dynamo=False,
+    )
+    LOGGER.info("Quantizing %s to %s", exported, path)
+    # Renamed once complete, an interrupted export is not taken for a model
+    quantized = path.with_name(path.stem + "-tmp.onnx")
+    quantize_dynamic(str(exported), str(quantized), weight_type=QuantType.QInt8)
+    os.replace(quantized, path)
+    exported.unlink()
+    return path
+
+
+class _OnnxModel:
+    """Callable standing in for the transformers model of the reader."""
+
+    def __init__(self, session: Any):
+        self.session = session
+
+    def __call__(self, input_ids: Any, attention_mask: Any) -> SimpleNamespace:
+        import torch
+
+        start, end = self.session.run(
+            ["start_logits", "end_logits"],
+            {
+                "input_ids": input_ids.cpu().numpy(),
+                "attention_mask": attention_mask.cpu().numpy(),
+            },
+        )
+        return SimpleNamespace(
+            start_logits=torch.from_numpy(start), end_logits=torch.from_numpy(end)
+        )
+
+
+@component
+class OnnxExtractiveReader(BatchExtractiveReader):
+    """Extractive reader running an int8 quantized ONNX export of the model.
+
+    The model is exported and quantized on the first warm up and cached under
+    `.cache/onnx`. Tokenization, answer extraction and scoring are those of
+    `ExtractiveReader`, only the forward pass runs in ONNX Runtime. All the
+    (query, passage) windows go through one forward pass unless
+    `max_batch_size` is set. `threads` bounds the threads used within an
+    operator (default: ONNX Runtime's choice, one per core).
+    """
+
+    def __init__(self, *args: Any, threads: int | None = None, **kwargs: Any):
+        """Create the reader, see `ExtractiveReader` for the arguments."""
+        # `@component` copies the class, so no zero-argument `super()`
+        BatchExtractiveReader.__init__(self, *args, **kwargs)
+        self.threads = threads
+
+    def warm_up(self):
+        """Export the model if needed and load it in an inference session."""
+        if self.model is not None:
+            return
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        name = str(self.model_name_or_path)
+        path = export_quantized(
+            name, ONNX_CACHE / name.strip("/").replace("/", "--") / "model-int8.onnx"
+        )
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        # One session serves one batch at a time, operators run in parallel
+        options.inter_op_num_threads = 1
+        session = onnxruntime.InferenceSession(
+            str(path), options, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(name)
+        self.device = ComponentDevice.from_str("cpu")
+        self.model = _OnnxModel(session)
+        LOGGER.info("Loaded ONNX reader from %s", path)
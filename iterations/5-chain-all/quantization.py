@@ -0,0 +1,68 @@
+"""Scalar (int8) and binary quantization of unit vectors.
+
+Codes are 4x (int8) or 32x (binary) smaller than float32 vectors. They rank
+candidates approximately; the best candidates are then rescored with the
+full-precision vectors.
+"""
+
+import numpy as np
+
+KINDS = ("int8", "binary")
+# Set bits of each byte, for NumPy < 2.0 which has no `np.bitwise_count`
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(
+    axis=1, dtype=np.uint8
+)
+
+
+def calibrate(vectors: np.ndarray, quantile: float = 0.99) -> float:
+    """Return the int8 scale, the `quantile` of the absolute components."""
+    scale = float(np.quantile(np.abs(vectors), quantile)) if len(vectors) else 0.0
+    return scale or 1.0
+
+
+def code_size(kind: str, dim: int) -> int:
+    """Return the bytes per code; binary codes are padded to 64-bit words."""
+    if kind == "int8":
+        return dim
+    if kind == "binary":
+        return (dim + 63) // 64 * 8
+    raise ValueError(f"Unknown quantization: {kind}")
+
+
+def code_dtype(kind: str) -> type:
+    """Return the NumPy type of the codes."""
+    return np.int8 if kind == "int8" else np.uint8
+
+
+def encode(kind: str, vectors: np.ndarray, scale: float) -> np.ndarray:
+    """Return the codes of unit vectors, one row per vector."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if kind == "int8":
+        return np.clip(np.rint(vectors * (127 / scale)), -127, 127).astype(np.int8)
+    bits = np.packbits(vectors > 0, axis=1)
+    codes = np.zeros((len(vectors), code_size(kind, vectors.shape[1])), np.uint8)
+    codes[:, : bits.shape[1]] = bits
+    return codes
+
+
+def prepare(kind: str, query: np.ndarray, scale: float) -> np.ndarray:
+    """Return the query in the form `score` compares codes to."""
+    if kind == "int8":
+        # Asymmetric: codes against the float query, scaled back to cosines
+        return query * (scale / 127)
+    return encode(kind, query[None], scale).view(np.uint64)[0]
+
+
+def score(kind: str, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Return approximate similarities of the codes to a prepared query.
+
+    Cosines for int8 codes, the negated Hamming distance for binary ones.
+    """
+    if kind == "int8":
+        return np.asarray(codes, dtype=np.float32) @ query
+    differences = np.asarray(codes).view(np.uint64) ^ query
+    if hasattr(np, "bitwise_count"):
+        distances = np.bitwise_count(differences)
+    else:
+        distances = POPCOUNT[differences.view(np.uint8)]
+    return -distances.sum(axis=1, dtype=np.int32).astype(np.float32)
@@ -0,0 +1,151 @@
+"""Two-level cache of retrieving pipeline responses."""
+
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+import json
+import logging
+import threading
+import time
+from typing import Any
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so trivial variations share a cache entry."""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+@dataclass
+class _Entry:
+    params: str
+    embedding: np.ndarray | None
+    response: Any
+    created: float
+
+
+class QueryCache:
+    """Cache of responses with an exact and a semantic level.
+
+    The exact level is keyed by the normalized question and the parameters.
+    The semantic level reuses the response of a cached question with the same
+    parameters whose embedding has a cosine similarity of at least
+    `threshold` with the new one. Entries expire after `ttl` seconds and the
+    least recently used ones are evicted beyond `max_entries`. The whole cache
+    is dropped whenever `version()` changes, e.g. after re-indexing.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600,
+        threshold: float = 0.95,
+        version: Callable[[], Any] = lambda: None,
+    ):
+        """Create an empty cache."""
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version = version
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.lookups = 0
+        self._entries: OrderedDict[tuple[str, str], _Entry] = OrderedDict()
+        self._version = version()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of cached responses."""
+        return len(self._entries)
+
+    @staticmethod
+    def _params(params: dict) -> str:
+        return json.dumps(params, sort_keys=True, default=str)
+
+    def _check(self):
+        """Drop the cache if the index changed, and expired entries."""
+        version = self.version()
+        if version != self._version:
+            LOGGER.info("Index changed, dropping %d cached response(s)", len(self))
+            self._entries.clear()
+            self._version = version
+        deadline = time.monotonic() - self.ttl
+        for key in [k for k, e in self._entries.items() if e.created < deadline]:
+            del self._entries[key]
+
+    def get(self, question: str, params: dict) -> Any | None:
+        """Return the response cached for exactly this question, if any."""
+        key = (normalize_question(question), self._params(params))
+        with self._lock:
+            self._check()
+            self.lookups += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.response
+
+    def get_similar(self, embedding: list[float], params: dict) -> Any | None:
+        """Return the response of the most similar cached question, if close enough.
+
+        Only call this after `get` missed, for the counters to add up.
+        """
+        params_key = self._params(params)
+        with self._lock:
+            keys = [
+                k
+                for k, e in self._entries.items()
+                if e.params == params_key and e.embedding is not None
+            ]
+            if not keys:
+                return None
+            matrix = np.stack([self._entries[k].embedding for k in keys])
+            query = np.asarray(embedding, dtype=np.float32)
+            scores = (
+                matrix
+                @ query
+                / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+            )
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            self._entries.move_to_end(keys[best])
+            self.semantic_hits += 1
+            return self._entries[keys[best]].response
+
+    def put(
+        self,
+        question: str,
+        params: dict,
+        response: Any,
+        embedding: list[float] | None = None,
+    ):
+        """Cache the response of a question."""
+        key = (normalize_question(question), self._params(params))
+        with self._lock:
+            self._entries[key] = _Entry(
+                params=key[1],
+                embedding=None
+                if embedding is None
+                else np.asarray(embedding, dtype=np.float32),
+                response=response,
+                created=time.monotonic(),
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Return the hit/miss counters."""
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "entries": len(self),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.lookups - hits,
+            "hit_ratio": hits / self.lookups if self.lookups else 0.0,
+        }
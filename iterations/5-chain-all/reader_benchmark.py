@@ -0,0 +1,116 @@
+"""Compare the latency and the answers of the torch and ONNX reader backends."""
+
+import argparse
+import json
+import logging
+import statistics
+import time
+
+from haystack import Document
+from retrieving import RetrievalService
+
+LOGGER = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+
+QUESTIONS = [
+    "What do I need for a vegan lasagna?",
+    "How long does the bread have to rise?",
+    "Which recipes use chickpeas?",
+    "At what temperature do I bake the cake?",
+]
+
+
+def retrieve(service: RetrievalService, questions: list[str], top_k: int) -> list:
+    """Return the chunks the retrieving pipeline passes to the reader."""
+    service.warm_up()
+    embedder = service.pipeline.get_component("embedder")
+    return [
+        service.retrieve(q, embedder.run(text=q)["embedding"], top_k) for q in questions
+    ]
+
+
+def measure(
+    reader, questions: list[str], documents: list[list[Document]], repeats: int
+) -> tuple[list, list[float]]:
+    """Answer each question `repeats` times, return the answers and latencies."""
+    reader.warm_up()
+    answers = []
+    latencies = []
+    for question, docs in zip(questions, documents, strict=True):
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result = reader.run(query=question, documents=docs, top_k=1)["answers"]
+            latencies.append(time.perf_counter() - started)
+        answers.append(result[0] if result else None)
+    return answers, latencies
+
+
+def compare(
+    model: str,
+    questions: list[str],
+    documents: list[list[Document]],
+    repeats: int = 5,
+    threads: int | None = None,
+) -> dict:
+    """Run both backends on the same inputs and compare them."""
+    results = {}
+    answers = {}
+    for backend in ("torch", "onnx"):
+        reader = RetrievalService(
+            reader_backend=backend, reader_threads=threads
+        )._reader(model)
+        # The first run pays for lazy initialization in both backends
+        measure(reader, questions[:1], documents[:1], 1)
+        answers[backend], latencies = measure(reader, questions, documents, repeats)
+        results[backend] = {
+            "p50": statistics.median(latencies),
+            "p95": statistics.quantiles(latencies, n=20)[-1]
+            if len(latencies) > 1
+            else latencies[0],
+        }
+    pairs = list(zip(answers["torch"], answers["onnx"], strict=True))
+    results["speedup_p50"] = results["torch"]["p50"] / results["onnx"]["p50"]
+    results["same_answer"] = sum(
+        (a.data if a else None) == (b.data if b else None) for a, b in pairs
+    ) / len(pairs)
+    results["max_score_difference"] = max(
+        abs((a.score if a else 0.0) - (b.score if b else 0.0)) for a, b in pairs
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--model",
+        default="deepset/roberta-base-squad2",
+        help="Reader model (default: deepset/roberta-base-squad2)",
+    )
+    parser.add_argument(
+        "--question",
+        nargs="+",
+        default=QUESTIONS,
+        help="Questions asked, with the chunks retrieved for them",
+    )
+    parser.add_argument(
+        "--top-k", type=int, default=5, help="Chunks per question (default: 5)"
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=5, help="Runs per question (default: 5)"
+    )
+    parser.add_argument(
+        "--threads", type=int, default=None, help="CPU threads of the readers"
+    )
+    args = parser.parse_args()
+    if args.threads:
+        import torch
+
+        torch.set_num_threads(args.threads)
+
+    documents = retrieve(RetrievalService(), args.question, args.top_k)
+    result = compare(args.model, args.question, documents, args.repeats, args.threads)
+    LOGGER.info("Result: %s", result)
+    print(json.dumps(result, indent=2))  # noqa: T201
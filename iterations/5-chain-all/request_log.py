@@ -0,0 +1,101 @@
+"""Cheap logging for the request path: sampled, structured and asynchronous."""
+
+import atexit
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import random
+from typing import Any
+
+
+class _Fields:
+    """Fields of a record, serialized only when a handler formats it."""
+
+    __slots__ = ("fields",)
+
+    def __init__(self, fields: dict[str, Any]):
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return json.dumps(self.fields, default=str, separators=(",", ":"))
+
+
+class _LazyQueueHandler(QueueHandler):
+    """Queue handler leaving the formatting to the listener thread.
+
+    The stock handler formats the message before queueing it, i.e. in the
+    request thread. The records of `RequestLog` only hold values which are not
+    modified afterwards, so they can cross threads as they are. Any other
+    record, or one with a traceback, is prepared as usual since its arguments
+    may change before the listener gets to them.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if (
+            not record.exc_info
+            and isinstance(record.args, tuple)
+            and any(isinstance(arg, _Fields) for arg in record.args)
+        ):
+            return record
+        return super().prepare(record)
+
+
+def enable_async_logging() -> QueueListener:
+    """Move the handlers of the root logger behind a queue and a thread.
+
+    Logging calls then only append the record to the queue, the formatting
+    and the I/O happen in the listener thread.
+    """
+    root = logging.getLogger()
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    listener = QueueListener(records, *root.handlers, respect_handler_level=True)
+    root.handlers = [_LazyQueueHandler(records)]
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+class RequestLog:
+    """Log one structured line per request, for a sample of the requests.
+
+    Requests are logged with probability `sample_rate`, failed ones always.
+    The fields are serialized as JSON only if the record is emitted.
+    """
+
+    def __init__(self, logger: logging.Logger, sample_rate: float = 1.0):
+        """Create the log writing to `logger`."""
+        self.logger = logger
+        self.sample_rate = sample_rate
+
+    def sampled(self) -> bool:
+        """Return whether to log the current request."""
+        return self.logger.isEnabledFor(logging.INFO) and (
+            self.sample_rate >= 1 or random.random() < self.sample_rate
+        )
+
+    def info(self, event: str, **fields: Any):
+        """Log a request, if it is sampled."""
+        if self.sampled():
+            self.emit(event, **fields)
+
+    def emit(self, event: str, **fields: Any):
+        """Log a request without sampling it, once `sampled` returned true.
+
+        Lets costly fields be computed only for the sampled requests.
+        """
+        self.logger.info("%s %s", event, _Fields(fields))
+
+    def error(self, event: str, **fields: Any):
+        """Log a failed request, always and with the traceback."""
+        self.logger.error("%s %s", event, _Fields(fields), exc_info=True)
+
+
+def documents_summary(documents: list) -> list[list]:
+    """Return the id and score of each document, not their content."""
+    return [[d.id, d.score] for d in documents]
+
+
+def answers_summary(answers: list) -> list[list]:
+    """Return the score and document id of each answer, not their text."""
+    return [[a.score, a.document.id if a.document else None] for a in answers]
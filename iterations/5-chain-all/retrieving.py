@@ -1,12 +1,16 @@
 """Simple example of how to use Haystack with Qdrant as a document store and retriever."""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 import logging
 from pathlib import Path
+import threading
+import time
+from typing import Any
 
-from haystack import Pipeline
-from haystack.components.embedders import SentenceTransformersTextEmbedder
-from haystack.components.readers import ExtractiveReader
-from haystack_integrations.components.retrievers.qdrant import QdrantEmbeddingRetriever
-from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
+from corpora import Corpus
+import metrics
+from query_cache import QueryCache
 
 LOGGER = logging.getLogger(__name__)
 logging.basicConfig(
@@ -15,35 +19,548 @@ logging.basicConfig(
 )
 
 DIR = Path(__file__).resolve().parent
+# Written by indexing.py
+CORPUS = Corpus()
+BM25 = CORPUS.bm25()
+EMBEDDED_STORE = CORPUS.embedded_store
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+READER_MODEL = "deepset/roberta-base-squad2"
 
-document_store = QdrantDocumentStore(
-    url="http://localhost:6333",
-    index="5-chain-all",
-    embedding_dim=384,
-    similarity="cosine",  # or "dot" or "euclidean"
+STAGE_SECONDS = metrics.histogram(
+    "retrieval_stage_seconds", "Duration of a retrieving stage per batch", ("stage",)
 )
-reader = ExtractiveReader(model="deepset/roberta-base-squad2")
-retrieving_pipeline = Pipeline()
-retrieving_pipeline.add_component(
-    "embedder",
-    SentenceTransformersTextEmbedder(model="sentence-transformers/all-MiniLM-L6-v2"),
+BATCH_SIZE = metrics.histogram(
+    "retrieval_batch_size",
+    "Questions per retrieving batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
 )
-retrieving_pipeline.add_component(
-    "retriever", QdrantEmbeddingRetriever(document_store=document_store)
+RETRIEVAL_ERRORS = metrics.counter(
+    "retrieval_errors_total", "Retrievals which failed, in any retriever or store"
 )
-retrieving_pipeline.add_component(instance=reader, name="reader")
 
-retrieving_pipeline.connect("embedder.embedding", "retriever.query_embedding")
-retrieving_pipeline.connect("retriever.documents", "reader.documents")
 
-retrieving_pipeline.draw(str(DIR / "retrieving.png"))
+@dataclass
+class AdaptivePolicy:
+    """Thresholds letting easy questions skip most of the retrieved chunks.
+
+    Chunks are cut after the first drop of at least `score_gap` in retriever
+    score and dropped below `similarity_floor`. The reader first reads only
+    the best chunk, and the others only if it found no answer with a score of
+    at least `confidence`. The scores are the cosine similarities of the dense
+    retriever, also in hybrid mode, where the reciprocal rank fusion only
+    tells in how many lists and how high a chunk is. `None` disables a
+    threshold.
+    """
+
+    score_gap: float | None = 0.1
+    similarity_floor: float | None = 0.25
+    confidence: float | None = 0.7
+
+    def select(self, documents: list) -> list:
+        """Return the chunks worth reading, best first."""
+        selected = []
+        for doc in documents:
+            score = doc.score or 0.0
+            if self.similarity_floor is not None and score < self.similarity_floor:
+                break
+            if (
+                self.score_gap is not None
+                and selected
+                and (selected[-1].score or 0.0) - score >= self.score_gap
+            ):
+                break
+            selected.append(doc)
+        return selected
+
+    def confident(self, answers: list) -> bool:
+        """Return whether an answer is good enough to stop reading."""
+        return self.confidence is not None and any(
+            a.data is not None and a.score >= self.confidence for a in answers
+        )
+
+
+class RetrievalService:
+    """Long-lived retrieving pipeline, loading its models once.
+
+    Heavy imports and model loading are deferred to `warm_up`, which runs a
+    dummy query so the first real question does not pay for lazy
+    initialization. `health` reports the readiness and the measured latencies.
+
+    With `hybrid`, the chunks of the dense retriever and of the BM25 index
+    (`candidates` each) are fused by reciprocal rank before the reader, which
+    finds exact terms like ingredient names at a smaller `top_k`.
+
+    `reader_backend` is "torch" for the transformers model or "onnx" for its
+    int8 quantized ONNX export, `reader_threads` the CPU threads of the ONNX
+    session. The threads of torch are shared by the whole process, so the
+    entry points set them.
+
+    With an `adaptive` policy, `run_batch` reads fewer chunks for questions
+    whose best chunk stands out, see `AdaptivePolicy`. In hybrid mode, it is
+    evaluated on the dense chunks before the fusion, and as many fused chunks
+    are kept as dense ones.
+
+    `store` is the backend of the chunks, "qdrant" at `url` or "embedded"
+    at `store_path`, see `stores`; `nprobe` is the number of IVF lists
+    searched if the embedded store has them, `oversampling` the factor of
+    `candidates` rescored with the full vectors if it has quantized codes. A
+    `document_store` given explicitly is used instead, e.g. an in-memory one
+    in the benchmarks.
+
+    The chunks of the corpus `index` are searched by default. Questions may
+    ask for other `corpora` instead, each searched in its own collection, BM25
+    index and embedded store, see `corpora`. Their retrievers are created on
+    first use and share the models. A question over several corpora searches
+    them in parallel, in up to `fan_out` threads, and merges their chunks by
+    score.
+    """
+
+    def __init__(
+        self,
+        url: str = "http://localhost:6333",
+        index: str = "5-chain-all",
+        draw: bool = False,
+        cache: QueryCache | None = None,
+        hybrid: bool = False,
+        bm25_path: Path = BM25,
+        candidates: int = 10,
+        reader_backend: str = "torch",
+        reader_threads: int | None = None,
+        adaptive: AdaptivePolicy | None = None,
+        store: str = "qdrant",
+        store_path: Path = EMBEDDED_STORE,
+        nprobe: int = 16,
+        oversampling: float = 4.0,
+        document_store: Any | None = None,
+        corpora: tuple[str, ...] = (),
+        fan_out: int = 8,
+        embedding_model: str = EMBEDDING_MODEL,
+        reader_model: str = READER_MODEL,
+    ):
+        """Create the service, without loading anything yet."""
+        self.url = url
+        self.index = index
+        self.hybrid = hybrid
+        self.bm25_path = bm25_path
+        self.candidates = candidates
+        self.reader_backend = reader_backend
+        self.reader_threads = reader_threads
+        self.adaptive = adaptive
+        self.store = store
+        self.store_path = store_path
+        self.nprobe = nprobe
+        self.oversampling = oversampling
+        self.document_store = document_store
+        self.corpora = corpora
+        self.fan_out = fan_out
+        self.embedding_model = embedding_model
+        self.reader_model = reader_model
+        self.draw = draw
+        self.cache = cache
+        self.pipeline = None
+        self.error: str | None = None
+        self.warm_up_seconds: float | None = None
+        self.first_answer_seconds: float | None = None
+        self._created = time.perf_counter()
+        self._lock = threading.Lock()
+        # Retrievers of the corpora other than `index`, by corpus
+        self._retrievers: dict[str, dict[str, Any]] = {}
+        self._retrievers_lock = threading.Lock()
+        self._pool: ThreadPoolExecutor | None = None
+
+    @property
+    def ready(self) -> bool:
+        """Return whether the models are loaded."""
+        return self.pipeline is not None
+
+    def _create_retrievers(
+        self, index: str, bm25_path: Path, store_path: Path, document_store: Any
+    ) -> dict[str, Any]:
+        """Return the retrievers of a corpus, by their name in the pipeline."""
+        from bm25 import BM25Index, BM25Retriever
+        from haystack.components.joiners import DocumentJoiner
+        from stores import create_document_store, create_embedding_retriever
+
+        document_store = document_store or create_document_store(
+            self.store,
+            url=self.url,
+            index=index,
+            path=store_path,
+            nprobe=self.nprobe,
+            oversampling=self.oversampling,
+        )
+        if not self.hybrid:
+            return {"retriever": create_embedding_retriever(document_store)}
+        # The joiner takes the name of the retriever, for the same inputs and
+        # outputs as the dense only pipeline
+        return {
+            "dense_retriever": create_embedding_retriever(
+                document_store, top_k=self.candidates
+            ),
+            "sparse_retriever": BM25Retriever(
+                BM25Index(bm25_path), document_store, top_k=self.candidates
+            ),
+            "retriever": DocumentJoiner(join_mode="reciprocal_rank_fusion"),
+        }
+
+    def _build(self):
+        from haystack import Pipeline
+        from haystack.components.embedders import SentenceTransformersTextEmbedder
+
+        reader = self._reader(self.reader_model)
+        retrieving_pipeline = Pipeline()
+        retrieving_pipeline.add_component(
+            "embedder",
+            SentenceTransformersTextEmbedder(model=self.embedding_model),
+        )
+        retrieving_pipeline.add_component(instance=reader, name="reader")
+        for name, retriever in self._create_retrievers(
+            self.index, self.bm25_path, self.store_path, self.document_store
+        ).items():
+            retrieving_pipeline.add_component(name, retriever)
+        if self.hybrid:
+            retrieving_pipeline.connect(
+                "embedder.embedding", "dense_retriever.query_embedding"
+            )
+            retrieving_pipeline.connect("dense_retriever", "retriever")
+            retrieving_pipeline.connect("sparse_retriever", "retriever")
+        else:
+            retrieving_pipeline.connect(
+                "embedder.embedding", "retriever.query_embedding"
+            )
+        retrieving_pipeline.connect("retriever.documents", "reader.documents")
+
+        if self.draw:
+            retrieving_pipeline.draw(str(DIR / "retrieving.png"))
+        return retrieving_pipeline
+
+    def _reader(self, model: str):
+        if self.reader_backend == "onnx":
+            from onnx_reader import OnnxExtractiveReader
+
+            return OnnxExtractiveReader(model=model, threads=self.reader_threads)
+        if self.reader_backend != "torch":
+            raise ValueError(f"Unknown reader backend: {self.reader_backend}")
+        from batching import BatchExtractiveReader
+
+        return BatchExtractiveReader(model=model)
+
+    def warm_up(self):
+        """Build the pipeline, load the models and run a dummy query."""
+        with self._lock:
+            if self.ready:
+                return
+            started = time.perf_counter()
+            try:
+                pipeline = self._build()
+                pipeline.warm_up()
+                question = "warm up"
+                pipeline.run(
+                    self._inputs(
+                        {
+                            "embedder": {"text": question},
+                            "retriever": {"top_k": 1},
+                            "reader": {"query": question, "top_k": 1},
+                        }
+                    )
+                )
+            except Exception as e:
+                self.error = repr(e)
+                raise
+            self.error = None
+            self.pipeline = pipeline
+            self.warm_up_seconds = time.perf_counter() - started
+            LOGGER.info("Retrieving pipeline warmed up in %.2fs", self.warm_up_seconds)
+
+    def _inputs(self, inputs: dict) -> dict:
+        """Add the query of the sparse retriever to the pipeline inputs."""
+        if not self.hybrid:
+            return inputs
+        question = inputs.get("embedder", {}).get("text", "")
+        return {**inputs, "sparse_retriever": {"query": question}}
+
+    def select(self, corpora: list[str] | None) -> tuple[str, ...]:
+        """Return the corpora a question asks for, `index` if none.
+
+        Raises `ValueError` for a corpus which is not served.
+        """
+        selected = tuple(dict.fromkeys(corpora or [self.index]))
+        unknown = [c for c in selected if c != self.index and c not in self.corpora]
+        if unknown:
+            raise ValueError(f"Unknown corpus: {', '.join(unknown)}")
+        return selected
+
+    def _corpus_retrievers(self, corpus: str) -> dict[str, Any]:
+        """Return the retrievers of a served corpus, created on first use."""
+        if corpus == self.index:
+            names = ("dense_retriever", "sparse_retriever", "retriever")
+            return {
+                name: self.pipeline.get_component(name)
+                for name in (names if self.hybrid else names[-1:])
+            }
+        with self._retrievers_lock:
+            if corpus not in self._retrievers:
+                LOGGER.info("Opening corpus %s", corpus)
+                paths = Corpus(corpus)
+                self._retrievers[corpus] = self._create_retrievers(
+                    paths.index, paths.bm25(self.store), paths.embedded_store, None
+                )
+            return self._retrievers[corpus]
+
+    def health(self) -> dict:
+        """Return the readiness of the service, for health probes."""
+        return {
+            "status": "ready" if self.ready else "error" if self.error else "starting",
+            "error": self.error,
+            "warm_up_seconds": self.warm_up_seconds,
+            "first_answer_seconds": self.first_answer_seconds,
+        }
+
+    def run(self, inputs: dict) -> dict:
+        """Run the retrieving pipeline with the given inputs.
+
+        Only the exact level of the cache is used here, see `run_batch`.
+        """
+        question = inputs.get("embedder", {}).get("text", "")
+        params = {
+            name: {k: v for k, v in args.items() if k not in ("text", "query")}
+            for name, args in inputs.items()
+        }
+        if self.cache is not None and (response := self.cache.get(question, params)):
+            return response
+
+        self.warm_up()
+        LOGGER.debug("Running retrieving pipeline with inputs: %s", inputs)
+        response = self.pipeline.run(
+            self._inputs(inputs), include_outputs_from=["retriever", "reader"]
+        )
+        LOGGER.debug("Pipeline run completed.")
+        self._answered()
+        if self.cache is not None:
+            self.cache.put(question, params, response)
+        return response
+
+    def run_batch(
+        self,
+        questions: list[str],
+        retriever_top_k: int = 5,
+        reader_top_k: int = 3,
+        read: bool = True,
+        corpora: list[tuple[str, ...]] | None = None,
+    ) -> list[dict]:
+        """Answer several questions with one embedding call and one reader pass.
+
+        Returns one response per question, shaped like the output of `run`.
+        Questions found in the cache, exactly or by embedding similarity,
+        skip the retriever and the reader. Without `read`, only the chunks
+        are retrieved and the answers are left empty. `corpora` gives the
+        corpora of each question, see `select`, `index` by default.
+        """
+        corpora = corpora or [(self.index,)] * len(questions)
+        params = [
+            {
+                "retriever_top_k": retriever_top_k,
+                "reader_top_k": reader_top_k,
+                "read": read,
+                "adaptive": asdict(self.adaptive) if self.adaptive else None,
+                "corpora": c,
+            }
+            for c in corpora
+        ]
+        responses: list[dict | None] = [None] * len(questions)
+        if self.cache is not None:
+            responses = [
+                self.cache.get(q, p) for q, p in zip(questions, params, strict=True)
+            ]
+        todo = [i for i, r in enumerate(responses) if r is None]
+        if not todo:
+            return responses
+
+        from haystack import tracing
+
+        self.warm_up()
+        embedder = self.pipeline.get_component("embedder")
+
+        BATCH_SIZE.observe(len(todo))
+        with (
+            tracing.tracer.trace("retrieving.embed", tags={"batch_size": len(todo)}),
+            STAGE_SECONDS.time(stage="embed"),
+        ):
+            embeddings = dict(
+                zip(
+                    todo,
+                    embedder.embedding_backend.embed(
+                        [
+                            embedder.prefix + questions[i] + embedder.suffix
+                            for i in todo
+                        ],
+                        batch_size=embedder.batch_size,
+                        show_progress_bar=False,
+                        normalize_embeddings=embedder.normalize_embeddings,
+                    ),
+                    strict=True,
+                )
+            )
+        if self.cache is not None:
+            for i in todo:
+                responses[i] = self.cache.get_similar(embeddings[i], params[i])
+            todo = [i for i in todo if responses[i] is None]
+
+        with (
+            tracing.tracer.trace("retrieving.retrieve", tags={"batch_size": len(todo)}),
+            STAGE_SECONDS.time(stage="retrieve"),
+        ):
+            documents = [
+                self._retrieve(questions[i], embeddings[i], retriever_top_k, corpora[i])
+                for i in todo
+            ]
+            if self.adaptive is not None and not self.hybrid:
+                documents = [self.adaptive.select(d) for d in documents]
+        with (
+            tracing.tracer.trace(
+                "retrieving.read",
+                tags={"batch_size": len(todo), "documents": sum(map(len, documents))},
+            ),
+            STAGE_SECONDS.time(stage="read"),
+        ):
+            answers = (
+                self._read([questions[i] for i in todo], documents, reader_top_k)
+                if read
+                else [[] for _ in todo]
+            )
+        for i, d, a in zip(todo, documents, answers, strict=True):
+            responses[i] = {"retriever": {"documents": d}, "reader": {"answers": a}}
+            if self.cache is not None:
+                self.cache.put(questions[i], params[i], responses[i], embeddings[i])
+        LOGGER.debug("Batch of %d question(s) completed.", len(questions))
+        self._answered()
+        return responses
+
+    def retrieve(
+        self,
+        question: str,
+        embedding: list[float],
+        top_k: int = 5,
+        corpora: tuple[str, ...] | None = None,
+    ) -> list:
+        """Return the chunks of one question, without running the reader.
+
+        These are the chunks `run_batch` reads, before the adaptive policy in
+        dense mode, for the benchmarks of the retrieval alone. `embedding` is
+        that of the question by the `embedder` of the pipeline.
+        """
+        self.warm_up()
+        return self._retrieve(question, embedding, top_k, corpora)
+
+    def _retrieve(
+        self,
+        question: str,
+        embedding: list[float],
+        top_k: int,
+        corpora: tuple[str, ...] | None = None,
+    ) -> list:
+        """Return the chunks of one question, fused with BM25 ones in hybrid mode.
+
+        Over several corpora, the best `top_k` of all their chunks, each
+        tagged with its corpus in `meta["corpus"]`.
+        """
+        corpora = corpora or (self.index,)
+        try:
+            if len(corpora) == 1:
+                return self._search(question, embedding, top_k, corpora[0])
+            with self._retrievers_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.fan_out, thread_name_prefix="fan-out"
+                    )
+            found = list(
+                self._pool.map(
+                    lambda corpus: self._search(question, embedding, top_k, corpus),
+                    corpora,
+                )
+            )
+        except Exception:
+            RETRIEVAL_ERRORS.inc()
+            raise
+        documents = []
+        for corpus, corpus_documents in zip(corpora, found, strict=True):
+            for doc in corpus_documents:
+                doc.meta["corpus"] = corpus
+            documents.extend(corpus_documents)
+        # Same embedder and fusion everywhere, so the scores compare
+        documents.sort(key=lambda d: d.score or 0.0, reverse=True)
+        return documents[:top_k]
+
+    def _search(
+        self, question: str, embedding: list[float], top_k: int, corpus: str
+    ) -> list:
+        retrievers = self._corpus_retrievers(corpus)
+        if not self.hybrid:
+            return retrievers["retriever"].run(query_embedding=embedding, top_k=top_k)[
+                "documents"
+            ]
+        candidates = max(top_k, self.candidates)
+        dense = retrievers["dense_retriever"].run(
+            query_embedding=embedding, top_k=candidates
+        )["documents"]
+        sparse = retrievers["sparse_retriever"].run(query=question, top_k=candidates)[
+            "documents"
+        ]
+        if self.adaptive is not None:
+            # Before the fusion, which replaces the scores
+            top_k = min(top_k, len(self.adaptive.select(dense)))
+            if not top_k:
+                return []
+        return retrievers["retriever"].run(documents=[dense, sparse], top_k=top_k)[
+            "documents"
+        ]
+
+    def _read(
+        self, questions: list[str], documents: list[list], top_k: int
+    ) -> list[list]:
+        """Run the reader, on the best chunk first with an adaptive policy."""
+        reader = self.pipeline.get_component("reader")
+        if self.adaptive is None or self.adaptive.confidence is None:
+            return reader.run_batch(questions, documents, top_k=top_k)
+        answers = reader.run_batch(questions, [d[:1] for d in documents], top_k=top_k)
+        again = [
+            i
+            for i, (a, d) in enumerate(zip(answers, documents, strict=True))
+            if len(d) > 1 and not self.adaptive.confident(a)
+        ]
+        if again:
+            for i, a in zip(
+                again,
+                reader.run_batch(
+                    [questions[i] for i in again],
+                    [documents[i] for i in again],
+                    top_k=top_k,
+                ),
+                strict=True,
+            ):
+                answers[i] = a
+        LOGGER.debug(
+            "%d of %d question(s) answered from their best chunk only",
+            len(questions) - len(again),
+            len(questions),
+        )
+        return answers
+
+    def _answered(self):
+        if self.first_answer_seconds is None:
+            self.first_answer_seconds = time.perf_counter() - self._created
+            LOGGER.info(
+                "Cold start to first answer took %.2fs", self.first_answer_seconds
+            )
+
+
+service = RetrievalService()
 
 
 def run(inputs: dict) -> dict:
     """Run the retrieving pipeline with the given inputs."""
-    LOGGER.info("Running retrieving pipeline with inputs: %s", inputs)
-    response = retrieving_pipeline.run(
-        inputs, include_outputs_from=["retriever", "reader"]
-    )
-    LOGGER.info("Pipeline run completed.")
-    return response
+    return service.run(inputs)
+
+
+if __name__ == "__main__":
+    RetrievalService(draw=True).warm_up()
@@ -0,0 +1,98 @@
+"""Document store backends, chosen by configuration.
+
+"qdrant" talks to a Qdrant service; "embedded" keeps the vectors in local
+memory-mapped files searched in process, see `embedded_store`.
+
+Both can keep quantized codes of the vectors ("int8" or "binary", see
+`quantization`) to scan instead of them, rescoring the best candidates with
+the full vectors.
+"""
+
+from pathlib import Path
+from typing import Any
+
+STORES = ("qdrant", "embedded")
+
+
+def qdrant_quantization(quantization: str | None) -> Any:
+    """Return the Qdrant quantization config of a collection, codes kept in RAM.
+
+    Qdrant only applies it when it creates the collection; queries then scan
+    the codes and rescore with the original vectors, which may stay on disk.
+    """
+    if quantization is None:
+        return None
+    from qdrant_client.http import models
+
+    if quantization == "int8":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        )
+    if quantization == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        )
+    raise ValueError(f"Unknown quantization: {quantization}")
+
+
+def create_document_store(
+    store: str,
+    url: str = "http://localhost:6333",
+    index: str = "5-chain-all",
+    path: Path | None = None,
+    embedding_dim: int = 384,
+    dtype: str = "float32",
+    prefer_grpc: bool = False,
+    ivf: bool = False,
+    nprobe: int = 16,
+    quantization: str | None = None,
+    oversampling: float = 4.0,
+) -> Any:
+    """Return the document store of the `store` backend.
+
+    `url`, `index` and `prefer_grpc` configure Qdrant; `path`, `dtype`, the
+    IVF index (`ivf`, `nprobe`) and `oversampling` the embedded store.
+    `quantization` applies to new Qdrant collections and embedded stores.
+    """
+    if store == "qdrant":
+        from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
+
+        return QdrantDocumentStore(
+            url=url,
+            prefer_grpc=prefer_grpc,
+            index=index,
+            embedding_dim=embedding_dim,
+            similarity="cosine",  # or "dot" or "euclidean"
+            on_disk=quantization is not None,
+            quantization_config=qdrant_quantization(quantization),
+        )
+    if store == "embedded":
+        from embedded_store import EmbeddedDocumentStore
+
+        if path is None:
+            raise ValueError("The embedded store needs a path")
+        return EmbeddedDocumentStore(
+            path,
+            embedding_dim=embedding_dim,
+            dtype=dtype,
+            ivf=ivf,
+            nprobe=nprobe,
+            quantization=quantization,
+            oversampling=oversampling,
+        )
+    raise ValueError(f"Unknown document store: {store}")
+
+
+def create_embedding_retriever(document_store: Any, top_k: int = 10) -> Any:
+    """Return the embedding retriever matching the type of `document_store`."""
+    from embedded_store import EmbeddedDocumentStore, EmbeddedEmbeddingRetriever
+
+    if isinstance(document_store, EmbeddedDocumentStore):
+        return EmbeddedEmbeddingRetriever(document_store=document_store, top_k=top_k)
+    from haystack_integrations.components.retrievers.qdrant import (
+        QdrantEmbeddingRetriever,
+    )
+
+    return QdrantEmbeddingRetriever(document_store=document_store, top_k=top_k)
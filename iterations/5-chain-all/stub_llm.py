@@ -0,0 +1,110 @@
+"""Stub OpenAI chat completions server, to run the client without OpenAI.
+
+Start it and point the client to it with
+`OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=stub`.
+A user message mentioning "files" is answered with an `ask_files` tool call
+when tools are offered, any other message with a plain text reply.
+"""
+
+import argparse
+import json
+import logging
+import time
+import uuid
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+import uvicorn
+
+LOGGER = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+
+
+def reply(body: dict) -> tuple[str | None, dict | None]:
+    """Return the text or the tool call answering the last message."""
+    last = body["messages"][-1]
+    content = last.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content)
+    tools = [t["function"]["name"] for t in body.get("tools") or []]
+    if last["role"] == "user" and "files" in content.lower() and tools:
+        arguments = json.dumps({"question": content})
+        return None, {"name": "ask_files", "arguments": arguments}
+    if last["role"] == "tool":
+        return f"According to the files: {content}", None
+    return f"Stub answer to: {content}", None
+
+
+def chunk(completion_id: str, delta: dict, finish_reason: str | None = None) -> str:
+    """Return a server-sent event with a completion chunk."""
+    data = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "stub",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(data)}\n\n"
+
+
+async def completions(request: Request):
+    """Answer a chat completion request, streamed or not."""
+    body = await request.json()
+    text, tool_call = reply(body)
+    LOGGER.info("Request with %d message(s)", len(body["messages"]))
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    finish_reason = "tool_calls" if tool_call else "stop"
+    tool_calls = (
+        [{"index": 0, "id": "call_1", "type": "function", "function": tool_call}]
+        if tool_call
+        else None
+    )
+
+    if not body.get("stream"):
+        message = {"role": "assistant", "content": text}
+        if tool_calls:
+            message["tool_calls"] = [
+                {k: v for k, v in c.items() if k != "index"} for c in tool_calls
+            ]
+        return JSONResponse(
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "stub",
+                "choices": [
+                    {"index": 0, "message": message, "finish_reason": finish_reason}
+                ],
+                "usage": {
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "total_tokens": 0,
+                },
+            }
+        )
+
+    def events():
+        yield chunk(completion_id, {"role": "assistant", "content": ""})
+        if tool_calls:
+            yield chunk(completion_id, {"tool_calls": tool_calls})
+        else:
+            for word in text.split(" "):
+                yield chunk(completion_id, {"content": word + " "})
+        yield chunk(completion_id, {}, finish_reason)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+app = Starlette(routes=[Route("/v1/chat/completions", completions, methods=["POST"])])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8001, help="Port (default: 8001)")
+    args = parser.parse_args()
+    uvicorn.run(app, port=args.port)
@@ -5,8 +5,24 @@ import importlib.util
 import logging
 from pathlib import Path
 import sys
+import threading
+import time
 
+from batching import MicroBatcher
+import component_tracing
+from corpora import Corpus
 from mcp.server.fastmcp import FastMCP
+import metrics
+from query_cache import QueryCache
+from request_log import (
+    RequestLog,
+    answers_summary,
+    documents_summary,
+    enable_async_logging,
+)
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from stores import STORES
 
 # run this server first before running the client mcp_filtered_tools.py or mcp_client.py
 # it shows how easy it is to create a MCP server in just a few lines of code
@@ -19,6 +35,9 @@ logging.basicConfig(
 )
 
 DIR = Path(__file__).resolve().parent
+# Corpora served, the first one answers the questions which name none
+CORPORA = [Corpus()]
+STORE = "qdrant"
 
 # Load module from file
 spec = importlib.util.spec_from_file_location(
@@ -28,34 +47,139 @@ retrieving_pipeline = importlib.util.module_from_spec(spec)
 sys.modules["retrieving_pipeline"] = retrieving_pipeline
 spec.loader.exec_module(retrieving_pipeline)
 
+
+def index_version() -> tuple[int | None, ...]:
+    """Return a token which changes whenever the index of a corpus is updated.
+
+    The manifests are written by indexing.py, a new mtime means the index changed.
+    """
+    return tuple(
+        path.stat().st_mtime_ns if path.exists() else None
+        for path in (corpus.manifest(STORE) for corpus in CORPORA)
+    )
+
+
+RETRIEVER_TOP_K = 5
+
+# Questions of all the corpora are batched together, the models are shared
+batcher = MicroBatcher(
+    lambda items: retrieving_pipeline.service.run_batch(
+        [question for question, _ in items],
+        retriever_top_k=RETRIEVER_TOP_K,
+        reader_top_k=3,
+        corpora=[corpora for _, corpora in items],
+    )
+)
+passage_batcher = MicroBatcher(
+    lambda items: retrieving_pipeline.service.run_batch(
+        [question for question, _ in items],
+        retriever_top_k=RETRIEVER_TOP_K,
+        reader_top_k=3,
+        read=False,
+        corpora=[corpora for _, corpora in items],
+    )
+)
+
+REQUESTS = metrics.counter(
+    "ask_files_requests_total", "Calls of ask_files", ("mode", "status")
+)
+IN_FLIGHT = metrics.gauge("ask_files_in_flight", "Calls of ask_files in progress")
+LATENCY = metrics.histogram(
+    "ask_files_seconds", "Duration of ask_files calls", ("mode",)
+)
+metrics.gauge(
+    "retrieval_ready",
+    "Whether the retrieving models are loaded",
+    function=lambda: float(retrieving_pipeline.service.ready),
+)
+metrics.gauge(
+    "retrieval_warm_up_seconds",
+    "Duration of the model warm up",
+    function=lambda: retrieving_pipeline.service.warm_up_seconds,
+)
+# Read from the cache counters at each scrape
+for name, kind, documentation in [
+    ("entries", metrics.gauge, "Responses in the query cache"),
+    ("exact_hits", metrics.counter, "Query cache hits on the same question"),
+    ("semantic_hits", metrics.counter, "Query cache hits on a similar question"),
+    ("misses", metrics.counter, "Query cache misses"),
+    ("hit_ratio", metrics.gauge, "Share of questions answered from the cache"),
+]:
+    kind(
+        f"query_cache_{name}" + ("_total" if kind is metrics.counter else ""),
+        documentation,
+        function=lambda name=name: (
+            retrieving_pipeline.service.cache.stats()[name]
+            if retrieving_pipeline.service.cache is not None
+            else None
+        ),
+    )
+
+# One line per sampled request, with ids and scores instead of chunk contents
+REQUEST_LOG = RequestLog(LOGGER)
+
 mcp = FastMCP("MCP Tool")
 
 
+@mcp.custom_route("/health", methods=["GET"])
+async def health(request: Request) -> JSONResponse:
+    """Report whether the models are loaded, for readiness probes."""
+    status = retrieving_pipeline.service.health()
+    return JSONResponse(status, status_code=200 if status["status"] == "ready" else 503)
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Expose the metrics to Prometheus."""
+    return PlainTextResponse(
+        metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 @mcp.tool(
     name="ask_files",
     description="Ask a question and retrieve answers from indexed files.",
 )
-def ask_files(question: str) -> str:
-    """Return a response from the retrieved files."""
-    LOGGER.info("Running pipeline with question: %s", question)
-    response = retrieving_pipeline.run(
-        {
-            "embedder": {"text": question},
-            "retriever": {"top_k": 5},
-            "reader": {"query": question, "top_k": 3},
-        }
-    )
-    LOGGER.info(
-        "Found %d documents with following answers",
-        len(response["retriever"]["documents"]),
-    )
-    LOGGER.info("=" * 80)
-    for answer in response["reader"]["answers"]:
-        LOGGER.info("Answer: %s", answer.data)
-        LOGGER.info("Document: %s", answer.document)
-        LOGGER.info("Score: %s", answer.score)
-        LOGGER.info("-" * 80)
+async def ask_files(
+    question: str, passages: bool = False, corpora: list[str] | None = None
+) -> str:
+    """Return a response from the retrieved files.
 
+    With `passages`, return the best matching passage without extracting an
+    answer from it. `corpora` names the corpora searched, the default one if
+    none; several are searched in parallel and their chunks merged.
+    """
+    mode = "passages" if passages else "answer"
+    started = time.perf_counter()
+    with IN_FLIGHT.track(), LATENCY.time(mode=mode):
+        try:
+            # Before batching, an unknown corpus must not fail the whole batch
+            selected = retrieving_pipeline.service.select(corpora)
+            response = await (passage_batcher if passages else batcher).submit(
+                (question, selected)
+            )
+        except Exception:
+            REQUESTS.inc(mode=mode, status="error")
+            REQUEST_LOG.error(
+                "ask_files", mode=mode, question=question, corpora=corpora
+            )
+            raise
+    REQUESTS.inc(mode=mode, status="ok")
+    # Summarized only for the sampled requests
+    if REQUEST_LOG.sampled():
+        REQUEST_LOG.emit(
+            "ask_files",
+            mode=mode,
+            question=question,
+            corpora=selected,
+            seconds=round(time.perf_counter() - started, 4),
+            documents=documents_summary(response["retriever"]["documents"]),
+            answers=answers_summary(response["reader"]["answers"]),
+        )
+
+    if passages:
+        documents = response["retriever"]["documents"]
+        return documents[0].content if documents else "No passage found."
     return (
         response["reader"]["answers"][0].data
         if response["reader"]["answers"]
@@ -75,5 +199,195 @@ if __name__ == "__main__":
         choices=["sse", "streamable-http"],
         help="Transport mechanism for the MCP server (default: streamable-http)",
     )
+    parser.add_argument(
+        "--no-warm-up",
+        action="store_true",
+        help="Load the models on the first question instead of at startup",
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=16,
+        help="Maximum number of questions answered together (default: 16)",
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=10,
+        help="Maximum time a question waits for others to batch with (default: 10)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of batches run concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Disable the query result cache"
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        help="Maximum number of cached responses (default: 1024)",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=3600,
+        help="Seconds a cached response stays valid (default: 3600)",
+    )
+    parser.add_argument(
+        "--cache-threshold",
+        type=float,
+        default=0.95,
+        help="Cosine similarity to reuse the response of another question (default: 0.95)",
+    )
+    parser.add_argument(
+        "--corpus",
+        type=Corpus,
+        nargs="+",
+        default=CORPORA,
+        help="Corpora served, indexed by indexing.py --corpus; the first one "
+        f"answers the questions which name none (default: {CORPORA[0].name})",
+    )
+    parser.add_argument(
+        "--fan-out",
+        type=int,
+        default=8,
+        help="Corpora searched in parallel for one question (default: 8)",
+    )
+    parser.add_argument(
+        "--store",
+        default="qdrant",
+        choices=STORES,
+        help="Document store written by indexing.py --store (default: qdrant)",
+    )
+    parser.add_argument(
+        "--nprobe",
+        type=int,
+        default=16,
+        help="IVF lists searched in an embedded store with them (default: 16)",
+    )
+    parser.add_argument(
+        "--oversampling",
+        type=float,
+        default=4.0,
+        help="Candidates rescored in an embedded store with quantized codes, "
+        "as a factor of the chunks retrieved (default: 4.0)",
+    )
+    parser.add_argument(
+        "--hybrid",
+        action="store_true",
+        help="Fuse dense and BM25 retrieval, see indexing.py for the BM25 index",
+    )
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        default=None,
+        help="Chunks passed to the reader (default: 5, or 3 with --hybrid)",
+    )
+    parser.add_argument(
+        "--reader-backend",
+        default="torch",
+        choices=["torch", "onnx"],
+        help="Reader inference backend, onnx runs an int8 quantized export (default: torch)",
+    )
+    parser.add_argument(
+        "--reader-threads",
+        type=int,
+        default=None,
+        help="CPU threads of the reader (default: one per core)",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Read fewer chunks when the best one stands out",
+    )
+    parser.add_argument(
+        "--score-gap",
+        type=float,
+        default=0.1,
+        help="Retriever score drop after which chunks are not read (default: 0.1)",
+    )
+    parser.add_argument(
+        "--similarity-floor",
+        type=float,
+        default=0.25,
+        help="Retriever score below which chunks are not read (default: 0.25)",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.7,
+        help="Answer score to stop after the best chunk (default: 0.7)",
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        default=None,
+        help="Append per-component timing spans to this JSON lines file",
+    )
+    parser.add_argument(
+        "--otel",
+        action="store_true",
+        help="Send the spans to the OpenTelemetry tracer configured by OTEL_* variables",
+    )
+    parser.add_argument(
+        "--log-sample-rate",
+        type=float,
+        default=1.0,
+        help="Share of requests logged, failed ones are always logged (default: 1.0)",
+    )
+    parser.add_argument(
+        "--sync-logging",
+        action="store_true",
+        help="Write the logs in the request threads instead of a background thread",
+    )
     args = parser.parse_args()
+    REQUEST_LOG.sample_rate = args.log_sample_rate
+    if not args.sync_logging:
+        enable_async_logging()
+    if args.trace or args.otel:
+        component_tracing.enable(args.trace, args.otel)
+    CORPORA = list(dict.fromkeys(args.corpus))
+    STORE = args.store
+    retrieving_pipeline.service.index = CORPORA[0].index
+    retrieving_pipeline.service.bm25_path = CORPORA[0].bm25(args.store)
+    retrieving_pipeline.service.store_path = CORPORA[0].embedded_store
+    retrieving_pipeline.service.corpora = tuple(c.name for c in CORPORA[1:])
+    retrieving_pipeline.service.fan_out = args.fan_out
+    retrieving_pipeline.service.store = args.store
+    retrieving_pipeline.service.nprobe = args.nprobe
+    retrieving_pipeline.service.oversampling = args.oversampling
+    retrieving_pipeline.service.hybrid = args.hybrid
+    retrieving_pipeline.service.reader_backend = args.reader_backend
+    retrieving_pipeline.service.reader_threads = args.reader_threads
+    if args.reader_threads and args.reader_backend == "torch":
+        import torch
+
+        torch.set_num_threads(args.reader_threads)
+    RETRIEVER_TOP_K = args.top_k or (3 if args.hybrid else 5)
+    if args.adaptive:
+        retrieving_pipeline.service.adaptive = retrieving_pipeline.AdaptivePolicy(
+            score_gap=args.score_gap,
+            similarity_floor=args.similarity_floor,
+            confidence=args.confidence,
+        )
+    for b in (batcher, passage_batcher):
+        b.max_batch_size = args.max_batch_size
+        b.max_wait = args.max_wait_ms / 1000
+        b.workers = args.workers
+    if not args.no_cache:
+        retrieving_pipeline.service.cache = QueryCache(
+            max_entries=args.cache_size,
+            ttl=args.cache_ttl,
+            threshold=args.cache_threshold,
+            version=index_version,
+        )
+    if not args.no_warm_up:
+        # Serve /health while the models load
+        threading.Thread(
+            target=retrieving_pipeline.service.warm_up, name="warm-up", daemon=True
+        ).start()
     mcp.run(transport=args.transport)
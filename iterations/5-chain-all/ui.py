@@ -1,11 +1,10 @@
 """UI."""
 
+import asyncio
 import importlib
 import logging
 from pathlib import Path
-import queue
 import sys
-import threading
 
 import dotenv
 import gradio as gr
@@ -20,6 +19,12 @@ logging.basicConfig(
 dotenv.load_dotenv()
 
 DIR = Path(__file__).resolve().parent
+# Streamed tokens are coalesced into at most one UI update per interval
+FRAME_INTERVAL = 0.05
+# Number of chats answered at the same time
+CONCURRENCY = 16
+# Put in the queue of a chat once its pipeline finished
+FINISHED = object()
 
 
 llm = OpenAIChatGenerator(
@@ -53,7 +58,7 @@ with gr.Blocks() as ui:
         LOGGER.info("User message: %s", user_message)
         return "", haystack_to_gradio(new_state), new_state
 
-    def bot(history: list, state: list):
+    async def bot(history: list, state: list):
         """Stream chat messages."""
         history.append(
             gr.ChatMessage(
@@ -62,38 +67,48 @@ with gr.Blocks() as ui:
                 metadata={"title": "Initializing..."},
             )
         )
-        q = queue.Queue()
+        loop = asyncio.get_running_loop()
+        q: asyncio.Queue = asyncio.Queue()
         response = ""
-        run_pipeline = client_pipeline.get_pipeline()
-        client_pipeline.set_stream_callback(lambda message: q.put(message))
-        t = threading.Thread(
-            # target=llm.run, args=(state, lambda message: q.put(message))
-            target=run_pipeline.run,
-            args=(
-                {
-                    "llm": {"messages": state},
-                    "adapter": {"initial_msg": state[-1:]},
-                },
-            ),
+        run = loop.run_in_executor(
+            None,
+            client_pipeline.run,
+            state,
+            lambda message: loop.call_soon_threadsafe(q.put_nowait, message),
         )
-        t.start()
+        # Scheduled after all chunks, as the callback is called from the loop too
+        run.add_done_callback(lambda _: q.put_nowait(FINISHED))
         try:
+            last_frame = 0.0
+            pending = False
             while True:
+                if pending and loop.time() - last_frame >= FRAME_INTERVAL:
+                    history[-1] = gr.ChatMessage(
+                        role="assistant",
+                        content=response,
+                        metadata={"title": "Streaming..."},
+                    )
+                    last_frame = loop.time()
+                    pending = False
+                    yield history, state
+                # Wait for chunks without polling, but flush pending ones
+                # once the frame interval is over
+                timeout = (
+                    max(0.0, last_frame + FRAME_INTERVAL - loop.time())
+                    if pending
+                    else None
+                )
                 try:
-                    chunk = q.get_nowait()
-                    if chunk is not None:
-                        LOGGER.info("Received chunk: %s", chunk.content)
-                        response += chunk.content
-                        history[-1] = gr.ChatMessage(
-                            role="assistant",
-                            content=response,
-                            metadata={"title": "Streaming..."},
-                        )
-                        yield history, state
-                except queue.Empty:
-                    if not t.is_alive() and q.empty():
-                        LOGGER.info("Thread finished.")
-                        break
+                    chunk = await asyncio.wait_for(q.get(), timeout)
+                except TimeoutError:
+                    continue
+                if chunk is FINISHED:
+                    LOGGER.info("Pipeline finished.")
+                    break
+                LOGGER.debug("Received chunk: %s", chunk.content)
+                response += chunk.content
+                pending = True
+            await run
             LOGGER.info("Assistant response: %s", response)
             new_state = state + [ChatMessage.from_assistant(response)]
             yield haystack_to_gradio(new_state), new_state
@@ -119,4 +134,5 @@ with gr.Blocks() as ui:
         outputs=[chatbot, state],
     )
 
+ui.queue(default_concurrency_limit=CONCURRENCY)
 ui.launch()
@@ -0,0 +1,153 @@
+"""Watch a directory and report the paths changed under it, debounced.
+
+File events come from inotify through watchdog, or from polling where inotify
+is unavailable or misses changes, e.g. on network shares, and without
+watchdog. Bursts of events, like a copy of many files or an editor saving
+through a temporary file, are reported together once no event came for
+`quiet` seconds, or `max_delay` seconds after the first one. While nothing
+changes, the watcher only waits.
+"""
+
+from collections.abc import Callable
+import logging
+from pathlib import Path
+import threading
+import time
+from typing import Any
+
+LOGGER = logging.getLogger(__name__)
+
+# Events which do not change the content of the directory
+IGNORED_EVENTS = {"opened", "closed_no_write"}
+
+
+class Debouncer:
+    """Collect changed paths and hand them out once their burst settled."""
+
+    def __init__(self, quiet: float = 1.0, max_delay: float = 10.0):
+        """Create an empty debouncer."""
+        self.quiet = quiet
+        self.max_delay = max_delay
+        self._paths: set[Path] = set()
+        self._first: float | None = None
+        self._last: float | None = None
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def add(self, *paths: Path):
+        """Record changed paths."""
+        with self._condition:
+            now = time.monotonic()
+            self._paths.update(paths)
+            self._first = self._first or now
+            self._last = now
+            self._condition.notify()
+
+    def dispatch(self, event: Any):
+        """Record the paths of a watchdog event, used as its event handler."""
+        if event.event_type in IGNORED_EVENTS or (
+            # A directory is modified when its entries are, which have their own events
+            event.is_directory and event.event_type == "modified"
+        ):
+            return
+        self.add(
+            *(Path(p) for p in (event.src_path, getattr(event, "dest_path", "")) if p)
+        )
+
+    def wait(self) -> list[Path] | None:
+        """Block until a burst of changes settled and return its paths.
+
+        Returns `None` once closed.
+        """
+        with self._condition:
+            while not self._closed:
+                if not self._paths:
+                    self._condition.wait()
+                    continue
+                now = time.monotonic()
+                due = min(self._last + self.quiet, self._first + self.max_delay)
+                if now < due:
+                    self._condition.wait(due - now)
+                    continue
+                paths, self._paths = sorted(self._paths), set()
+                self._first = self._last = None
+                return paths
+            return None
+
+    def close(self):
+        """Wake up and end `wait`."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+def start_observer(
+    root: Path, handler: Debouncer, polling: bool = False, interval: float = 2.0
+) -> Any | None:
+    """Start watching `root` recursively, return the watchdog observer.
+
+    Uses inotify unless `polling`, and polls every `interval` seconds if
+    inotify fails, e.g. when out of watches. Returns `None` without watchdog.
+    """
+    try:
+        from watchdog.observers import Observer
+        from watchdog.observers.polling import PollingObserver
+    except ImportError:
+        LOGGER.warning("watchdog is not installed, polling %s", root)
+        return None
+    if not polling:
+        observer = Observer()
+        observer.schedule(handler, str(root), recursive=True)
+        try:
+            observer.start()
+        except OSError as e:
+            LOGGER.warning("Cannot watch %s (%s), polling it instead", root, e)
+        else:
+            LOGGER.info("Watching %s with %s", root, type(observer).__name__)
+            return observer
+    observer = PollingObserver(timeout=interval)
+    observer.schedule(handler, str(root), recursive=True)
+    observer.start()
+    LOGGER.info("Polling %s every %.1fs", root, interval)
+    return observer
+
+
+def watch(
+    root: Path,
+    on_change: Callable[[list[Path] | None], Any],
+    quiet: float = 1.0,
+    max_delay: float = 10.0,
+    polling: bool = False,
+    interval: float = 2.0,
+):
+    """Call `on_change` with the paths changed under `root`, until interrupted.
+
+    Without watchdog, `on_change` gets `None` every `interval` seconds, to
+    look for changes everywhere. An error in `on_change` is logged and the
+    watch goes on.
+    """
+    debouncer = Debouncer(quiet, max_delay)
+    observer = start_observer(root, debouncer, polling, interval)
+    try:
+        while True:
+            if observer is None:
+                time.sleep(interval)
+                paths = None
+            else:
+                paths = debouncer.wait()
+            started = time.perf_counter()
+            try:
+                on_change(paths)
+            except Exception:
+                LOGGER.exception("Handling the changes of %s failed", root)
+                continue
+            LOGGER.info(
+                "Handled %s changed path(s) in %.2fs",
+                "all" if paths is None else len(paths),
+                time.perf_counter() - started,
+            )
+    finally:
+        debouncer.close()
+        if observer is not None:
+            observer.stop()
+            observer.join()
@@ -0,0 +1,7 @@
+"""Shared test setup: the modules of the latest iteration are scripts, not a package."""
+
+from pathlib import Path
+import sys
+
+ITERATION = Path(__file__).resolve().parent.parent / "iterations" / "5-chain-all"
+sys.path.insert(0, str(ITERATION))
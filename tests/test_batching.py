@@ -0,0 +1,60 @@
+"""Tests of the micro-batched extractive reader."""
+
+from batching import BatchExtractiveReader
+from haystack import Document
+import pytest
+
+WORDS = (
+    "the a is in of capital city paris france river seine flows through berlin germany"
+)
+
+
+@pytest.fixture(scope="module")
+def reader(tmp_path_factory: pytest.TempPathFactory) -> BatchExtractiveReader:
+    """Return a warmed up reader with a tiny, randomly initialised model."""
+    import torch
+    from transformers import BertConfig, BertForQuestionAnswering, BertTokenizerFast
+
+    path = tmp_path_factory.mktemp("model")
+    vocab = path / "vocab.txt"
+    vocab.write_text(
+        "\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", *WORDS.split()]),
+        encoding="utf-8",
+    )
+    BertTokenizerFast(vocab_file=str(vocab)).save_pretrained(path)
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=len(WORDS.split()) + 5,
+        hidden_size=16,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        intermediate_size=32,
+    )
+    BertForQuestionAnswering(config).save_pretrained(path)
+    reader = BatchExtractiveReader(model=str(path), device=None, top_k=50)
+    reader.warm_up()
+    return reader
+
+
+def test_short_document_does_not_shift_answers(reader: BatchExtractiveReader):
+    """Answers stay with their query when a sequence has few candidates."""
+    queries = ["capital of france", "river in paris"]
+    documents = [
+        [Document(content="Paris")],
+        [Document(content="the seine flows through paris " * 4)],
+    ]
+    batched = reader.run_batch(queries, documents)
+    for query, docs, answers in zip(queries, documents, batched, strict=True):
+        expected = reader.run(query=query, documents=docs)["answers"]
+        assert all(a.query == query for a in answers)
+        assert [(a.data, a.document) for a in answers] == [
+            (a.data, a.document) for a in expected
+        ]
+        assert [a.score for a in answers] == pytest.approx([a.score for a in expected])
+
+
+def test_queries_without_documents_get_no_answers(reader: BatchExtractiveReader):
+    """Like `run`, a query without documents has no answers."""
+    answers = reader.run_batch(["a", "b"], [[], [Document(content="berlin")]])
+    assert answers[0] == []
+    assert answers[1]
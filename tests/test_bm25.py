@@ -0,0 +1,83 @@
+"""Tests of the BM25 index."""
+
+from pathlib import Path
+import threading
+
+from bm25 import BM25Index
+from haystack import Document
+
+
+def chunk(id_: str, content: str, source: str) -> Document:
+    """Return a chunk of the file `source`."""
+    return Document(id=id_, content=content, meta={"source_path": source})
+
+
+def test_search_after_save_and_reopen(tmp_path: Path):
+    """Saved chunks are found again by a new instance, best match first."""
+    index = BM25Index(tmp_path / "bm25")
+    index.add(
+        [
+            chunk("1", "tomato soup with basil", "soup.txt"),
+            chunk("2", "tomato salad", "salad.txt"),
+            chunk("3", "chocolate cake", "cake.txt"),
+        ]
+    )
+    assert len(index) == 0
+    index.save()
+    assert len(index) == 3
+
+    reopened = BM25Index(tmp_path / "bm25")
+    assert [i for i, _ in reopened.search("tomato basil")] == ["1", "2"]
+    assert reopened.search("pizza") == []
+
+
+def test_remove_and_replace_by_source(tmp_path: Path):
+    """Removing a file drops all its chunks, adding a chunk again replaces it."""
+    index = BM25Index(tmp_path / "bm25")
+    index.add(
+        [
+            chunk("1", "tomato soup", "soup.txt"),
+            chunk("2", "basil soup", "soup.txt"),
+            chunk("3", "chocolate cake", "cake.txt"),
+        ]
+    )
+    index.save()
+    index.remove(["soup.txt"])
+    index.add([chunk("3", "lemon cake", "cake.txt")])
+    index.save()
+
+    assert len(index) == 1
+    assert index.search("soup") == []
+    assert index.search("chocolate") == []
+    assert [i for i, _ in index.search("lemon")] == ["3"]
+
+
+def test_refresh_sees_other_writers(tmp_path: Path):
+    """A reader picks up the index saved by another instance."""
+    reader = BM25Index(tmp_path / "bm25")
+    assert reader.search("soup") == []
+    writer = BM25Index(tmp_path / "bm25")
+    writer.add([chunk("1", "tomato soup", "soup.txt")])
+    writer.save()
+    assert [i for i, _ in reader.search("soup")] == ["1"]
+
+
+def test_refresh_waits_for_a_save_swapping_directories(tmp_path: Path):
+    """A reader refreshing between the two renames of a save waits for the new index."""
+    path = tmp_path / "bm25"
+    writer = BM25Index(path)
+    writer.add([chunk("1", "tomato soup", "soup.txt")])
+    writer.save()
+    reader = BM25Index(path)
+    writer.add([chunk("2", "basil soup", "soup.txt")])
+    writer.save()
+
+    # Replay the swap of the new index: only the old directory exists for a while
+    old = path.with_name("bm25.old")
+    path.rename(old)
+    swap = threading.Timer(0.2, old.rename, [path])
+    swap.start()
+    try:
+        assert sorted(i for i, _ in reader.search("soup")) == ["1", "2"]
+    finally:
+        swap.join()
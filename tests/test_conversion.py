@@ -0,0 +1,32 @@
+"""Tests of the parallel file conversion."""
+
+from pathlib import Path
+
+from conversion import ParallelConverter
+import pytest
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_documents_grouped_by_mime_type_in_source_order(tmp_path: Path, workers: int):
+    """Documents come back by mime type, then in the order of the sources."""
+    texts = []
+    for i in range(3):
+        texts.append(tmp_path / f"{i}.txt")
+        texts[-1].write_text(f"text {i}", encoding="utf-8")
+    markdown = tmp_path / "notes.md"
+    markdown.write_text("# Notes", encoding="utf-8")
+
+    converter = ParallelConverter(workers=workers)
+    converter.warm_up()
+    try:
+        documents = converter.run(text_sources=texts, markdown_sources=[markdown])[
+            "documents"
+        ]
+    finally:
+        converter.close()
+    assert [d.content.strip() for d in documents] == [
+        "text 0",
+        "text 1",
+        "text 2",
+        "Notes",
+    ]
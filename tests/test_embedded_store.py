@@ -0,0 +1,76 @@
+"""Tests of the embedded document store."""
+
+from pathlib import Path
+import threading
+
+from embedded_store import EmbeddedDocumentStore
+from haystack import Document
+from haystack.document_stores.types import DuplicatePolicy
+import numpy as np
+
+
+def documents(count: int, dim: int = 8, source: str = "file.txt") -> list[Document]:
+    """Return `count` documents with random embeddings."""
+    rng = np.random.default_rng(count)
+    return [
+        Document(
+            id=f"{source}-{i}",
+            content=f"chunk {i}",
+            meta={"source_path": source},
+            embedding=rng.standard_normal(dim).tolist(),
+        )
+        for i in range(count)
+    ]
+
+
+def test_search_filter_and_reopen(tmp_path: Path):
+    """Written documents are searched, filtered and found again after reopening."""
+    store = EmbeddedDocumentStore(tmp_path / "store", embedding_dim=8)
+    docs = documents(5) + documents(3, source="other.txt")
+    assert store.write_documents(docs) == 8
+
+    best = store.embedding_retrieval(docs[2].embedding, top_k=2)
+    assert best[0].id == docs[2].id
+    assert best[0].score > best[1].score
+    other = {"field": "meta.source_path", "operator": "==", "value": "other.txt"}
+    assert len(store.filter_documents(other)) == 3
+    assert {
+        d.id for d in store.embedding_retrieval(docs[0].embedding, 10, filters=other)
+    } == {d.id for d in docs[5:]}
+
+    reopened = EmbeddedDocumentStore(tmp_path / "store", embedding_dim=8)
+    assert reopened.count_documents() == 8
+    assert reopened.get_documents_by_id([docs[7].id])[0].content == "chunk 2"
+
+
+def test_delete_overwrite_and_compact(tmp_path: Path):
+    """Deleted and overwritten rows disappear, also after compacting them away."""
+    store = EmbeddedDocumentStore(tmp_path / "store", embedding_dim=8)
+    docs = documents(8)
+    store.write_documents(docs)
+    store.delete_documents([docs[0].id])
+    docs[1].content = "updated"
+    store.write_documents([docs[1]], policy=DuplicatePolicy.OVERWRITE)
+    source = {"field": "meta.source_path", "operator": "in", "value": ["file.txt"]}
+    assert len(store.filter_documents(source)) == 7
+
+    store.delete_documents([d.id for d in docs[2:4]])
+    # Compacted once a quarter of the rows were deleted
+    assert store.rows == 5
+    assert store.count_documents() == 5
+    assert store.get_documents_by_id([docs[1].id])[0].content == "updated"
+    assert store.embedding_retrieval(docs[0].embedding, top_k=10)[0].id != docs[0].id
+
+
+def test_reader_waits_for_compaction_swap(tmp_path: Path):
+    """A reader loading between the renames of a compaction sees the new store."""
+    path = tmp_path / "store"
+    EmbeddedDocumentStore(path, embedding_dim=8).write_documents(documents(3))
+    old = path.with_name("store.old")
+    path.rename(old)
+    swap = threading.Timer(0.1, old.rename, (path,))
+    swap.start()
+    try:
+        assert EmbeddedDocumentStore(path, embedding_dim=8).count_documents() == 3
+    finally:
+        swap.join()
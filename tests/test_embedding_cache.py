@@ -0,0 +1,64 @@
+"""Tests of the persistent embedding cache."""
+
+from pathlib import Path
+
+from embedding_cache import EmbeddingCache
+
+
+def test_reopen_returns_saved_vectors(tmp_path: Path):
+    """Saved vectors are found again by a new instance."""
+    cache = EmbeddingCache(tmp_path / "cache", model="m", dim=2, max_entries=4)
+    cache.put("some  text", [1.0, 2.0])
+    cache.save()
+
+    reopened = EmbeddingCache(tmp_path / "cache", model="m", dim=2, max_entries=4)
+    assert reopened.get("some text") == [1.0, 2.0]
+    assert reopened.get("other text") is None
+
+
+def test_slot_reused_before_save_is_a_miss(tmp_path: Path):
+    """A slot evicted and overwritten after the last save is not read for its old key."""
+    cache = EmbeddingCache(tmp_path / "cache", model="m", dim=2, max_entries=1)
+    cache.put("old", [1.0, 1.0])
+    cache.save()
+    # Evicts "old", then the process dies without saving
+    cache.put("new", [2.0, 2.0])
+
+    reopened = EmbeddingCache(tmp_path / "cache", model="m", dim=2, max_entries=1)
+    assert reopened.get("old") is None
+
+
+def test_model_name_with_dots(tmp_path: Path):
+    """A dot in the cache name is not taken for a suffix."""
+    for name in ("bge-small-en-v1.5", "bge-small-en-v1.6"):
+        cache = EmbeddingCache(tmp_path / name, model=name, dim=2, max_entries=2)
+        cache.put("text", [1.0, 0.0] if name.endswith("5") else [0.0, 1.0])
+        cache.save()
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        f"bge-small-en-v1.{v}.{suffix}"
+        for v in (5, 6)
+        for suffix in ("f32", "json", "keys")
+    ]
+    cache = EmbeddingCache(
+        tmp_path / "bge-small-en-v1.5", model="bge-small-en-v1.5", dim=2, max_entries=2
+    )
+    assert cache.get("text") == [1.0, 0.0]
+
+
+def test_put_after_stale_entry_keeps_live_entries(tmp_path: Path):
+    """The slot of a stale entry is reused, not the one of a live entry."""
+    cache = EmbeddingCache(tmp_path / "cache", model="m", dim=2, max_entries=3)
+    for i, text in enumerate(("a", "b", "c")):
+        cache.put(text, [float(i), 0.0])
+    cache.save()
+    # Another process evicts "a" for "x" without saving
+    other = EmbeddingCache(tmp_path / "cache", model="m", dim=2, max_entries=3)
+    other.put("x", [9.0, 9.0])
+
+    reopened = EmbeddingCache(tmp_path / "cache", model="m", dim=2, max_entries=3)
+    assert reopened.get("a") is None
+    reopened.put("d", [3.0, 0.0])
+    assert sorted(reopened._slots.values()) == [0, 1, 2]
+    assert reopened.get("b") == [1.0, 0.0]
+    assert reopened.get("c") == [2.0, 0.0]
+    assert reopened.get("d") == [3.0, 0.0]
@@ -0,0 +1,56 @@
+"""Tests of the IVF index and of its use in the embedded store."""
+
+from pathlib import Path
+
+from embedded_store import EmbeddedDocumentStore
+from haystack import Document
+import ivf
+import numpy as np
+
+
+def clusters(count: int, dim: int = 16, centers: int = 4, seed: int = 0):
+    """Return unit vectors around `centers` directions, and their cluster."""
+    rng = np.random.default_rng(seed)
+    directions = rng.standard_normal((centers, dim))
+    labels = rng.integers(0, centers, count)
+    vectors = directions[labels] + 0.05 * rng.standard_normal((count, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32), labels
+
+
+def test_train_separates_clusters():
+    """With more lists than clusters, each list holds a single cluster."""
+    vectors, labels = clusters(400)
+    centroids = ivf.train(vectors, 8)
+    assert np.allclose(np.linalg.norm(centroids, axis=1), 1, atol=1e-5)
+    lists = ivf.assign(centroids, vectors)
+    for i in range(8):
+        assert len(set(labels[lists == i])) <= 1
+
+
+def test_inverted_lists_probe_built_and_appended_rows():
+    """Probing returns the rows of the lists, appended rows included."""
+    lists = np.array([0, 1, 0, 2, 1, 0], dtype=np.int32)
+    inverted = ivf.InvertedLists(lists[:4], nlist=3)
+    assert inverted.probe(lists, np.array([0])).tolist() == [0, 2, 5]
+    assert inverted.probe(lists, np.array([1, 2])).tolist() == [1, 3, 4]
+    assert not inverted.stale(len(lists))
+
+
+def test_store_search_with_ivf(tmp_path: Path):
+    """The approximate search of the store finds the exact nearest neighbour."""
+    vectors, _ = clusters(300)
+    store = EmbeddedDocumentStore(
+        tmp_path / "store", embedding_dim=16, ivf=True, nlist=4, ivf_min_rows=100
+    )
+    store.write_documents(
+        [
+            Document(id=str(i), content=str(i), embedding=v.tolist())
+            for i, v in enumerate(vectors)
+        ]
+    )
+    assert store._centroids is not None
+    for i in (0, 150, 299):
+        exact = store.embedding_retrieval(vectors[i].tolist(), top_k=1, exact=True)
+        found = store.embedding_retrieval(vectors[i].tolist(), top_k=1, nprobe=1)
+        assert found[0].id == exact[0].id == str(i)
@@ -0,0 +1,55 @@
+"""Tests of the manifest of indexed files."""
+
+import os
+from pathlib import Path
+
+from manifest import FileManifest
+
+
+def write(path: Path, text: str, mtime: float = 1_000_000.0):
+    """Write a file with a fixed modification time."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def test_diff_added_changed_removed(tmp_path: Path):
+    """Only files whose content changed are reindexed, and the manifest persists."""
+    root = tmp_path / "data"
+    for name in ("a.txt", "b.txt", "c.txt"):
+        write(root / name, name)
+    manifest = FileManifest(tmp_path / "manifest.json", root)
+    diff = manifest.diff(sorted(root.iterdir()))
+    assert [p.name for p in diff.added] == ["a.txt", "b.txt", "c.txt"]
+    manifest.apply(diff)
+    manifest.save()
+
+    # Touched but same content, new content, removed
+    write(root / "a.txt", "a.txt", mtime=2_000_000.0)
+    write(root / "b.txt", "new content")
+    (root / "c.txt").unlink()
+    manifest = FileManifest(tmp_path / "manifest.json", root)
+    assert len(manifest) == 3
+    diff = manifest.diff(sorted(root.iterdir()))
+    assert diff.added == []
+    assert [p.name for p in diff.changed] == ["b.txt"]
+    assert diff.removed == ["c.txt"]
+    assert diff.unchanged == 1
+    assert [p.name for p in diff.to_index] == ["b.txt"]
+
+    manifest.apply(diff)
+    assert not manifest.diff(sorted(root.iterdir()))
+
+
+def test_diff_within_reports_removed_there_only(tmp_path: Path):
+    """With `within`, files elsewhere are not reported removed."""
+    root = tmp_path / "data"
+    write(root / "sub" / "a.txt", "a")
+    write(root / "other" / "b.txt", "b")
+    manifest = FileManifest(tmp_path / "manifest.json", root)
+    manifest.apply(manifest.diff([root / "sub" / "a.txt", root / "other" / "b.txt"]))
+
+    (root / "sub" / "a.txt").unlink()
+    diff = manifest.diff([], within=["sub"])
+    assert diff.removed == ["sub/a.txt"]
+    assert manifest.diff([], within=["."]).removed == ["other/b.txt", "sub/a.txt"]
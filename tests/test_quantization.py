@@ -0,0 +1,75 @@
+"""Tests of the quantized codes and of their use in the embedded store."""
+
+from pathlib import Path
+
+from embedded_store import EmbeddedDocumentStore
+from haystack import Document
+import numpy as np
+import pytest
+import quantization
+
+
+def unit_vectors(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Return random unit vectors."""
+    vectors = np.random.default_rng(seed).standard_normal((count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.mark.parametrize(("kind", "size"), [("int8", 100), ("binary", 16)])
+def test_code_size(kind: str, size: int):
+    """Int8 codes take a byte per dimension, binary ones a bit, in 64-bit words."""
+    codes = quantization.encode(kind, unit_vectors(3, 100), scale=0.3)
+    assert codes.shape == (3, quantization.code_size(kind, 100)) == (3, size)
+    assert codes.dtype == quantization.code_dtype(kind)
+
+
+def test_int8_scores_approximate_cosines():
+    """Int8 codes scored against the float query give about the cosines."""
+    vectors = unit_vectors(50, 64)
+    scale = quantization.calibrate(vectors)
+    codes = quantization.encode("int8", vectors, scale)
+    query = quantization.prepare("int8", vectors[0], scale)
+    scores = quantization.score("int8", codes, query)
+    assert np.abs(scores - vectors @ vectors[0]).max() < 0.05
+
+
+def test_binary_scores_rank_the_same_vector_first():
+    """The Hamming distance of a vector's code to itself is zero, the best."""
+    vectors = unit_vectors(50, 64)
+    codes = quantization.encode("binary", vectors, 1.0)
+    scores = quantization.score(
+        "binary", codes, quantization.prepare("binary", vectors[7], 1.0)
+    )
+    assert scores[7] == 0
+    assert np.argmax(scores) == 7
+
+
+def test_binary_scores_without_bitwise_count(monkeypatch: pytest.MonkeyPatch):
+    """The lookup table of NumPy < 2.0 gives the same Hamming distances."""
+    vectors = unit_vectors(50, 100)
+    codes = quantization.encode("binary", vectors, 1.0)
+    query = quantization.prepare("binary", vectors[7], 1.0)
+    expected = quantization.score("binary", codes, query)
+    monkeypatch.delattr(np, "bitwise_count", raising=False)
+    assert np.array_equal(quantization.score("binary", codes, query), expected)
+
+
+@pytest.mark.parametrize("kind", quantization.KINDS)
+def test_store_rescores_quantized_candidates(tmp_path: Path, kind: str):
+    """The store searches the codes and rescores with the full vectors."""
+    vectors = unit_vectors(200, 64)
+    store = EmbeddedDocumentStore(
+        tmp_path / "store", embedding_dim=64, quantization=kind
+    )
+    store.write_documents(
+        [
+            Document(id=str(i), content=str(i), embedding=v.tolist())
+            for i, v in enumerate(vectors)
+        ]
+    )
+    assert store._quantized == kind
+    reopened = EmbeddedDocumentStore(tmp_path / "store", embedding_dim=64)
+    for store_ in (store, reopened):
+        found = store_.embedding_retrieval(vectors[3].tolist(), top_k=3)
+        assert found[0].id == "3"
+        assert found[0].score == pytest.approx(1.0, abs=1e-5)
@@ -0,0 +1,61 @@
+"""Tests of the cache of retrieving pipeline responses."""
+
+import pytest
+import query_cache
+from query_cache import QueryCache
+
+
+def test_exact_hit_on_normalized_question():
+    """Case, spacing and trailing punctuation do not matter, parameters do."""
+    cache = QueryCache()
+    cache.put("How long do I bake it?", {"top_k": 3}, "an hour")
+    assert cache.get("  how long do I  bake it ", {"top_k": 3}) == "an hour"
+    assert cache.get("How long do I bake it?", {"top_k": 5}) is None
+    assert cache.stats()["exact_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_semantic_hit_above_threshold_only():
+    """A similar enough question with the same parameters reuses the response."""
+    cache = QueryCache(threshold=0.9)
+    cache.put("bake time", {"top_k": 3}, "an hour", embedding=[1.0, 0.0])
+    assert cache.get_similar([0.99, 0.1], {"top_k": 3}) == "an hour"
+    assert cache.get_similar([0.6, 0.8], {"top_k": 3}) is None
+    assert cache.get_similar([1.0, 0.0], {"top_k": 5}) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch: pytest.MonkeyPatch):
+    """An entry older than `ttl` seconds is not returned."""
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = QueryCache(ttl=10)
+    cache.put("question", {}, "response")
+    now[0] += 9
+    assert cache.get("question", {}) == "response"
+    now[0] += 2
+    assert cache.get("question", {}) is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_evicted():
+    """Beyond `max_entries`, the least recently used entry is evicted."""
+    cache = QueryCache(max_entries=2)
+    cache.put("a", {}, 1)
+    cache.put("b", {}, 2)
+    assert cache.get("a", {}) == 1
+    cache.put("c", {}, 3)
+    assert cache.get("b", {}) is None
+    assert cache.get("a", {}) == 1
+    assert cache.get("c", {}) == 3
+
+
+def test_dropped_when_version_changes():
+    """All entries are dropped once the index version changed."""
+    version = [1]
+    cache = QueryCache(version=lambda: version[0])
+    cache.put("question", {}, "old response")
+    assert cache.get("question", {}) == "old response"
+    version[0] = 2
+    assert cache.get("question", {}) is None
+    assert len(cache) == 0
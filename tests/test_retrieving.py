@@ -0,0 +1,104 @@
+"""Tests of the adaptive policy of the retrieving service."""
+
+from haystack import Document
+from haystack.components.joiners import DocumentJoiner
+from haystack.dataclasses import ExtractedAnswer
+import pytest
+from retrieving import AdaptivePolicy, RetrievalService
+
+
+def scored(*scores: float) -> list[Document]:
+    """Return chunks with the given retriever scores, best first."""
+    return [
+        Document(id=f"d{i}", content=f"chunk {i}", score=s)
+        for i, s in enumerate(scores)
+    ]
+
+
+class FakeRetriever:
+    """Retriever returning the same chunks for any query."""
+
+    def __init__(self, documents: list[Document]):
+        """Return `documents` for every query."""
+        self.documents = documents
+
+    def run(self, top_k: int, **_) -> dict:
+        """Return the first `top_k` chunks."""
+        return {"documents": self.documents[:top_k]}
+
+
+class FakeReader:
+    """Reader answering with a fixed score per question, recording its calls."""
+
+    def __init__(self, scores: dict[str, float]):
+        """Answer each question with its score in `scores`."""
+        self.scores = scores
+        self.calls: list[list[int]] = []
+
+    def run_batch(self, queries: list[str], documents: list[list], top_k: int) -> list:
+        """Return one answer per question, from its best chunk."""
+        self.calls.append([len(d) for d in documents])
+        return [
+            [
+                ExtractedAnswer(
+                    query=q, score=self.scores[q], data="answer", document=d[0]
+                )
+            ]
+            for q, d in zip(queries, documents, strict=True)
+        ]
+
+
+class FakePipeline:
+    """Pipeline only holding components."""
+
+    def __init__(self, **components):
+        """Hold the components by name."""
+        self.components = components
+
+    def get_component(self, name: str):
+        """Return the component `name`."""
+        return self.components[name]
+
+
+def test_select_cuts_at_score_gap_and_floor():
+    """Chunks after a drop of `score_gap` or below `similarity_floor` are cut."""
+    policy = AdaptivePolicy(score_gap=0.1, similarity_floor=0.25)
+    assert [d.id for d in policy.select(scored(0.9, 0.85, 0.6, 0.55))] == ["d0", "d1"]
+    assert [d.id for d in policy.select(scored(0.5, 0.45, 0.2))] == ["d0", "d1"]
+    assert policy.select(scored(0.2, 0.15)) == []
+    unlimited = AdaptivePolicy(score_gap=None, similarity_floor=None)
+    assert len(unlimited.select(scored(0.9, 0.5, 0.1))) == 3
+
+
+def test_read_stops_at_confident_best_chunk():
+    """Only the questions without a confident answer read all their chunks."""
+    service = RetrievalService(adaptive=AdaptivePolicy(confidence=0.7))
+    reader = FakeReader({"easy": 0.9, "hard": 0.3})
+    service.pipeline = FakePipeline(reader=reader)
+
+    answers = service._read(["easy", "hard"], [scored(0.9, 0.8), scored(0.7, 0.6)], 3)
+
+    assert reader.calls == [[1, 1], [2]]
+    assert [a[0].score for a in answers] == [0.9, 0.3]
+
+
+@pytest.mark.parametrize(
+    ("dense_scores", "expected"),
+    [((0.9, 0.5, 0.45), 1), ((0.6, 0.55, 0.5), 3), ((0.2, 0.15, 0.1), 0)],
+)
+def test_hybrid_policy_reads_dense_scores(
+    monkeypatch: pytest.MonkeyPatch, dense_scores: tuple, expected: int
+):
+    """In hybrid mode, the dense scores before the fusion decide the cut-off."""
+    service = RetrievalService(hybrid=True, adaptive=AdaptivePolicy())
+    sparse = [
+        Document(id=f"s{i}", content=f"term {i}", score=9.0 - i) for i in range(3)
+    ]
+    retrievers = {
+        "dense_retriever": FakeRetriever(scored(*dense_scores)),
+        "sparse_retriever": FakeRetriever(sparse),
+        "retriever": DocumentJoiner(join_mode="reciprocal_rank_fusion"),
+    }
+    monkeypatch.setattr(service, "_corpus_retrievers", lambda corpus: retrievers)
+
+    assert len(service._retrieve("question", [1.0, 0.0], 5)) == expected
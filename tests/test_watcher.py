@@ -0,0 +1,81 @@
+"""Tests of the debounced directory watcher."""
+
+from pathlib import Path
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from watcher import Debouncer, start_observer
+
+
+def event(event_type: str, src: str, dest: str = "", is_directory: bool = False):
+    """Return a stand-in for a watchdog event."""
+    return SimpleNamespace(
+        event_type=event_type, src_path=src, dest_path=dest, is_directory=is_directory
+    )
+
+
+def test_burst_reported_once_quiet():
+    """Paths changed in a burst are reported together, once no event came."""
+    debouncer = Debouncer(quiet=0.05, max_delay=10)
+    debouncer.add(Path("b"))
+    debouncer.add(Path("a"), Path("b"))
+    started = time.monotonic()
+    assert debouncer.wait() == [Path("a"), Path("b")]
+    assert time.monotonic() - started >= 0.04
+
+
+def test_steady_events_reported_after_max_delay():
+    """Events which never stop are still reported after `max_delay`."""
+    debouncer = Debouncer(quiet=0.2, max_delay=0.3)
+    stop = threading.Event()
+
+    def keep_changing():
+        while not stop.is_set():
+            debouncer.add(Path("busy"))
+            time.sleep(0.02)
+
+    thread = threading.Thread(target=keep_changing)
+    thread.start()
+    started = time.monotonic()
+    try:
+        assert debouncer.wait() == [Path("busy")]
+    finally:
+        stop.set()
+        thread.join()
+    assert time.monotonic() - started < 0.3 + 0.2
+
+
+def test_dispatch_skips_events_without_changes():
+    """Reads and directory modifications are ignored, moves report both paths."""
+    debouncer = Debouncer(quiet=0)
+    debouncer.dispatch(event("opened", "a"))
+    debouncer.dispatch(event("closed_no_write", "a"))
+    debouncer.dispatch(event("modified", "dir", is_directory=True))
+    debouncer.dispatch(event("moved", "old", "new"))
+    assert debouncer.wait() == [Path("new"), Path("old")]
+
+
+def test_close_ends_wait():
+    """Closing wakes up a waiting thread, which gets `None`."""
+    debouncer = Debouncer()
+    threading.Timer(0.05, debouncer.close).start()
+    assert debouncer.wait() is None
+
+
+def test_observer_reports_new_file(tmp_path: Path):
+    """A file created under the watched directory is reported."""
+    pytest.importorskip("watchdog")
+    debouncer = Debouncer(quiet=0.1, max_delay=2)
+    observer = start_observer(tmp_path, debouncer, polling=True, interval=0.1)
+    timeout = threading.Timer(5, debouncer.close)
+    try:
+        (tmp_path / "new.txt").write_text("new", encoding="utf-8")
+        timeout.start()
+        assert tmp_path / "new.txt" in (debouncer.wait() or [])
+    finally:
+        timeout.cancel()
+        debouncer.close()
+        observer.stop()
+        observer.join()
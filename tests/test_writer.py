@@ -0,0 +1,66 @@
+"""Tests of the batched, concurrent document writer."""
+
+from haystack import Document
+from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
+import pytest
+from writer import BulkDocumentWriter
+
+
+def documents(count: int) -> list[Document]:
+    """Return `count` documents with small embeddings."""
+    return [
+        Document(id=str(i), content=f"chunk {i}", embedding=[float(i), 1.0, 0.0, 0.0])
+        for i in range(count)
+    ]
+
+
+def store() -> QdrantDocumentStore:
+    """Return an empty in-memory Qdrant store."""
+    return QdrantDocumentStore(
+        ":memory:", index="test", embedding_dim=4, recreate_index=True
+    )
+
+
+def test_writes_batches_idempotently():
+    """Every batch is written, and writing the same documents again overwrites them."""
+    document_store = store()
+    writer = BulkDocumentWriter(document_store, batch_size=2, max_in_flight=2)
+    try:
+        assert writer.run(documents(5))["documents_written"] == 5
+        assert writer.run(documents(5))["documents_written"] == 5
+    finally:
+        writer.close()
+    assert document_store.count_documents() == 5
+
+
+def test_retries_failed_upserts(monkeypatch: pytest.MonkeyPatch):
+    """A failed upsert is retried, up to `retries` times."""
+    document_store = store()
+    writer = BulkDocumentWriter(document_store, batch_size=10, retries=2, backoff=0)
+    writer.warm_up()
+    upsert = document_store.client.upsert
+    calls = []
+
+    def flaky_upsert(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise ConnectionError("connection reset")
+        return upsert(**kwargs)
+
+    monkeypatch.setattr(document_store.client, "upsert", flaky_upsert)
+    try:
+        assert writer.run(documents(3))["documents_written"] == 3
+        assert len(calls) == 2
+
+        def failing_upsert(**kwargs):
+            calls.append(kwargs)
+            raise ConnectionError("connection refused")
+
+        calls.clear()
+        monkeypatch.setattr(document_store.client, "upsert", failing_upsert)
+        with pytest.raises(ConnectionError):
+            writer.run(documents(3))
+        assert len(calls) == 3
+    finally:
+        writer.close()
+    assert document_store.count_documents() == 3